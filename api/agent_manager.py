@@ -1,7 +1,9 @@
 import os
+import asyncio
+import hashlib
 import importlib
 import re
-from groq import Groq
+from groq import Groq, AsyncGroq
 from openai import AsyncAzureOpenAI
 from agents import Agent, set_default_openai_client, Runner, OpenAIChatCompletionsModel
 from our_agents_definition.base_agent import BaseAgentOutput
@@ -9,8 +11,17 @@ from supervisor import Supervisor
 from settings import load_prompt, SUPERVISOR_PROMPT_FILE  # Import the new load_prompt function
 from dotenv import load_dotenv
 import json  # Added import for JSON formatting
-from openai import AzureOpenAI
-from transformers.html_transformer  import HTMLTransformer  # Import HTMLTransformer
+from transformers.html_transformer  import HTMLTransformer, HtmlOutput  # Import HTMLTransformer
+from html_templates import render_template
+from transformers.render_cache import RenderCache
+from utils.concurrency import llm_semaphore
+from utils.profile_store import ProfileStore
+from utils.session_store import SessionStore, SESSION_MAX_IN_MEMORY, SESSION_IDLE_TTL
+from utils.ttl_cache import TTLCache
+from utils.rolling_summary import ConversationSummarizer, SUMMARY_RECENT_TURNS, format_turns, html_to_text
+from utils.micro_batcher import MicroBatcher
+from utils.point_analytics import PointAnalytics
+from utils.point_extractor import extract_points_locally, POINT_EXTRACTOR, POINT_EXTRACTOR_MIN_CONFIDENCE
 
 # Load environment variables
 load_dotenv()
@@ -25,16 +36,11 @@ openai_client = AsyncAzureOpenAI(
     azure_deployment=llm_model_name
 )
 
-client = AzureOpenAI(
-  azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT"),
-  api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-  api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-  azure_deployment=llm_model_name
-)
-
 # Set up Groq client
 groq_client = Groq(
     api_key=os.getenv("GROQ_API_KEY"))
+async_groq_client = AsyncGroq(
+    api_key=os.getenv("GROQ_API_KEY"))
 
 # Set the default OpenAI client for the Agents SDK
 set_default_openai_client(openai_client, False)
@@ -45,7 +51,7 @@ azure_model = OpenAIChatCompletionsModel(
 )
 
 # Instantiate HTMLTransformer
-html_transformer = HTMLTransformer(groq_client, llm_model_name)
+html_transformer = HTMLTransformer(groq_client, llm_model_name, async_groq_client, render_cache=RenderCache())
 
 # Dynamically import all agents from the agents folder
 agents = []
@@ -101,35 +107,67 @@ supervisor_agent = Supervisor(
     html_transformer=html_transformer
 )
 
-# Store conversation history and pain points in memory (can be replaced with a database for persistence)
-conversation_histories = {}
-user_data = {}  # Placeholder for user data
-user_pain_points = {}  # Store pain points for each user
-user_good_points = {}  # Store good points for each user
+# Conversation history and pain/good points for each user, idle sessions are spilled to disk
+session_store = SessionStore()
+
+# Older turns are folded into a bounded rolling summary in the background, so "stop" reads
+# the summary plus the last few turns instead of replaying the whole conversation
+summarizer = ConversationSummarizer(openai_client, llm_model_name)
+pending_summaries = {}  # Summary update task running for each user
+
+# Speculative final reports: after every turn the report is drafted in the background, so
+# "stop" can return it directly if nothing changed since. Costs one report per turn, hence opt-in.
+FINAL_REPORT_DRAFTS = os.getenv("FINAL_REPORT_DRAFTS", "false").lower() == "true"
+report_drafts = TTLCache(SESSION_MAX_IN_MEMORY, SESSION_IDLE_TTL)  # Latest draft task for each user
+draft_stats = {"built": 0, "cancelled": 0, "used": 0, "discarded": 0}
+
+# Render the Final Output Agent's structured answer directly instead of sending it back to the LLM
+FINAL_REPORT_SINGLE_PASS = os.getenv("FINAL_REPORT_SINGLE_PASS", "true").lower() == "true"
+final_report_renders = {"single_pass": 0, "transformer": 0}
+
+# Define the path for the legacy user data JSON file, imported into the profile store on first run
+USER_DATA_FILE = os.path.join(os.path.dirname(__file__), "user_data.json")
+
+# Per-user profiles (name, age, country, ...) persisted in SQLite
+profile_store = ProfileStore(legacy_json_path=USER_DATA_FILE)
+
+# Pain and good points aggregated across users, per country and age band
+point_analytics = PointAnalytics()
+
+# How pain/good points are extracted on "prompt" turns:
+# - "parallel": extraction runs alongside the supervisor, the turn waits for the slower of the two
+# - "background": extraction starts after the response is built, its points show up on the next turn
+POINT_EXTRACTION_MODE = os.getenv("POINT_EXTRACTION_MODE", "parallel").lower()
+pending_extractions = {}  # Background extraction tasks still running for each user
+point_extraction_stats = {"mode": POINT_EXTRACTOR, "local": 0, "escalated": 0, "llm": 0}
 
 from pydantic import BaseModel
 
-async def extract_points_from_response(user_input: str) -> list:
+class PointsResponse(BaseModel):
+    pain_points: list[str]
+    good_points: list[str]
+
+async def extract_points_from_response(user_input: str) -> PointsResponse:
     """
-    Extract specific problems mentioned by the user from the LLM response in JSON format by sending a structured prompt.
-    
+    Extract the pain and good points of a user message, locally when the rules are confident
+    and with the LLM otherwise (see POINT_EXTRACTOR).
+
     Parameters:
-    - supervisor_agent: The supervisor agent instance
-    - user_input: The user's input message
-    
+    - user_input: The user's own message
+
     Returns:
-    - A list of specific problems extracted from the JSON response
+    - The pain points and good points detected
     """
-
-    class PointsResponse(BaseModel):
-        pain_points: list[str]
-        good_points: list[str]
-
-
-    structured_prompt = f"""
-    {user_input}
-    
-    Por favor, analiza este mensaje y detecta problemas específicos mencionados por el usuario y puntos positivos específicos mencionados por el usuario.
+    if POINT_EXTRACTOR != "llm":
+        local = extract_points_locally(user_input)
+        if POINT_EXTRACTOR == "local" or local.confidence >= POINT_EXTRACTOR_MIN_CONFIDENCE:
+            point_extraction_stats["local"] += 1
+            print(f"Points extracted locally: {local.pain_points} / {local.good_points}")
+            return PointsResponse(pain_points=local.pain_points, good_points=local.good_points)
+        point_extraction_stats["escalated"] += 1
+    return await extract_points_with_llm(user_input)
+
+POINT_EXTRACTION_EXAMPLES = """
     Por ejemplo:
     - "Tengo problemas para pagar mis facturas" se traduce a "problema": "problemas financieros"
     - "Estoy preocupado por mi salud"   se traduce a "problema": "preocupaciones de salud"
@@ -139,23 +177,409 @@ async def extract_points_from_response(user_input: str) -> list:
     - "Me encuentro con salud y bienestar" se traduce a "punto positivo": "salud y bienestar"
     Solo se requiere un problema por mensaje.
     """
+
+class IndexedPointsResponse(PointsResponse):
+    index: int
+
+class BatchPointsResponse(BaseModel):
+    items: list[IndexedPointsResponse]
+
+async def extract_points_with_llm(user_input: str) -> PointsResponse:
+    """
+    Extract specific problems mentioned by the user from the LLM response in JSON format by sending a structured prompt.
+    Messages from concurrent users are batched into one request by point_batcher.
+    
+    Parameters:
+    - user_input: The user's input message
+    
+    Returns:
+    - The pain points and good points detected, empty lists if the extraction fails
+    """
+    point_extraction_stats["llm"] += 1
     try:
-        completion = client.beta.chat.completions.parse(
+        response = await point_batcher.submit(user_input)
+
+        print(f"Pain point response: {response.pain_points}")
+        print(f"Good point response: {response.good_points}")
+ 
+        return response
+    except Exception as e:
+        # Extraction runs next to the supervisor, so a failure here must not sink the whole turn
+        print(f"Error parsing pain points response: {e}")
+        return PointsResponse(pain_points=[], good_points=[])
+
+async def extract_points_single(user_input: str) -> PointsResponse:
+    """
+    Run the structured extraction prompt for one message.
+    """
+    structured_prompt = f"""
+    {user_input}
+    
+    Por favor, analiza este mensaje y detecta problemas específicos mencionados por el usuario y puntos positivos específicos mencionados por el usuario.
+    {POINT_EXTRACTION_EXAMPLES}"""
+    async with llm_semaphore:
+        completion = await openai_client.beta.chat.completions.parse(
             model=llm_model_name,
             messages=[
                 {"role": "system", "content": structured_prompt}
             ],
             response_format=PointsResponse
         )
-        response = completion.choices[0].message.parsed
+    return completion.choices[0].message.parsed
 
-        print(f"Pain point response: {response.pain_points}")
-        print(f"Good point response: {response.good_points}")
- 
-        return response
-    except (json.JSONDecodeError, AttributeError) as e:
-        print(f"Error parsing pain points response: {e}")
-        return []  # Fallback if the response is not valid JSON or processing fails
+async def extract_points_batch(user_inputs: list) -> list:
+    """
+    Run the structured extraction prompt for several messages of different users in one request.
+
+    Returns:
+    - One PointsResponse per message, in order
+    """
+    if len(user_inputs) == 1:
+        return [await extract_points_single(user_inputs[0])]
+
+    numbered_messages = "\n".join(
+        f"[{index}] {json.dumps(user_input, ensure_ascii=False)}" for index, user_input in enumerate(user_inputs)
+    )
+    structured_prompt = f"""
+    {numbered_messages}
+    
+    Estos son mensajes independientes de usuarios distintos, cada uno con su número entre corchetes.
+    Por favor, analiza cada mensaje por separado y detecta problemas específicos mencionados por el usuario y puntos positivos específicos mencionados por el usuario.
+    Devuelve un elemento en "items" por mensaje, con su número en "index".
+    {POINT_EXTRACTION_EXAMPLES}"""
+    async with llm_semaphore:
+        completion = await openai_client.beta.chat.completions.parse(
+            model=llm_model_name,
+            messages=[
+                {"role": "system", "content": structured_prompt}
+            ],
+            response_format=BatchPointsResponse
+        )
+    by_index = {item.index: PointsResponse(pain_points=item.pain_points, good_points=item.good_points)
+                for item in completion.choices[0].message.parsed.items}
+
+    # Messages the model skipped are asked again one by one rather than silently left empty
+    missing = [index for index in range(len(user_inputs)) if index not in by_index]
+    if missing:
+        print(f"Batched extraction skipped {len(missing)} of {len(user_inputs)} messages, retrying them one by one")
+        retried = await asyncio.gather(*[extract_points_single(user_inputs[index]) for index in missing])
+        by_index.update(zip(missing, retried))
+    return [by_index[index] for index in range(len(user_inputs))]
+
+# Extraction requests from concurrent conversations share upstream calls
+point_batcher = MicroBatcher(extract_points_batch)
+
+def merge_points(user_id: str, points: PointsResponse):
+    """
+    Merge newly extracted pain and good points into the user's accumulated points.
+    """
+    new_pain_points = [point.capitalize() for point in points.pain_points]
+    new_good_points = [point.capitalize() for point in points.good_points]
+
+    print(f"Extracted pain points: {new_pain_points} from user_id: {user_id}")
+
+    session = session_store.get(user_id)
+
+    # Points already known under another wording only bump their count, the order stays first-seen
+    first_pain_points = session.pain_points.update(new_pain_points)
+    first_good_points = session.good_points.update(new_good_points)
+
+    # Cross-user counts only see each point once per user, repeats within a conversation are ignored
+    point_analytics.record(profile_store.get(user_id), first_pain_points, first_good_points)
+
+def schedule_point_extraction(user_id: str, user_message: str):
+    """
+    Run the point extraction as a background task whose results are merged when it finishes.
+    """
+    async def extract_and_merge():
+        points = await extract_points_from_response(user_message)
+        merge_points(user_id, points)
+
+    task = asyncio.create_task(extract_and_merge())
+    tasks = pending_extractions.setdefault(user_id, set())
+    tasks.add(task)
+
+    def forget(finished_task):
+        tasks.discard(finished_task)
+        if not tasks and pending_extractions.get(user_id) is tasks:
+            pending_extractions.pop(user_id, None)
+
+    task.add_done_callback(forget)
+
+async def wait_for_pending_extractions(user_id: str):
+    """
+    Wait for any background extraction still running for the user.
+    """
+    tasks = pending_extractions.get(user_id)
+    if tasks:
+        await asyncio.gather(*list(tasks), return_exceptions=True)
+
+async def summarize_session(user_id: str):
+    """
+    Fold every turn older than the last SUMMARY_RECENT_TURNS into the user's rolling summary.
+    """
+    while True:
+        session = session_store.get(user_id)
+        fold_count = len(session.turns) - SUMMARY_RECENT_TURNS
+        if fold_count <= 0:
+            return
+        folded = [(turn.role, turn.content) for turn in session.turns[:fold_count]]
+        try:
+            async with llm_semaphore:
+                summary = await summarizer.update(session.summary, session.turns[:fold_count])
+        except Exception as e:
+            # The turns stay in the history and are folded in on the next attempt
+            print(f"Error updating conversation summary: {e}")
+            return
+
+        # New turns may have arrived meanwhile, drop only the ones that were summarized
+        session = session_store.get(user_id)
+        position = 0
+        for role, content in folded:
+            if position < len(session.turns) and (session.turns[position].role, session.turns[position].content) == (role, content):
+                position += 1
+        session.drop_turns(position)
+        session.summary = summary
+
+def schedule_summary_update(user_id: str):
+    """
+    Start a background summary update for the user unless one is already running.
+    """
+    task = pending_summaries.get(user_id)
+    if task is not None and not task.done():
+        return  # The running update keeps folding until only the recent turns are left
+
+    task = asyncio.create_task(summarize_session(user_id))
+    pending_summaries[user_id] = task
+
+    def forget(finished_task):
+        if pending_summaries.get(user_id) is finished_task:
+            pending_summaries.pop(user_id, None)
+
+    task.add_done_callback(forget)
+
+def build_final_input(user_id: str, session) -> dict:
+    """
+    Collect everything the final report is built from: the rolling summary of older turns plus
+    the most recent turns verbatim, the user's profile and the accumulated points.
+    """
+    conversation_text = ""
+    if session.summary:
+        conversation_text += f"Resumen de la conversación anterior: {session.summary}\n\n"
+    conversation_text += format_turns(session.turns)
+
+    return {
+        "conversation": conversation_text,
+        "user_data": json.dumps(profile_store.get(user_id), ensure_ascii=False),
+        "pain_points": session.pain_points.labels(),
+        "good_points": session.good_points.labels()
+    }
+
+def report_fingerprint(final_input: dict) -> str:
+    return hashlib.sha256(json.dumps(final_input, sort_keys=True).encode("utf-8")).hexdigest()
+
+def render_final_report(output):
+    """
+    Render the Final Output Agent's answer without another LLM call.
+
+    A complete page in html_summary is used as is, anything else goes through the local
+    FinalOutputAgentOutput template (summary, problems, recommendations, user data).
+
+    Returns:
+    - HtmlOutput, or None if the answer has nothing to render
+    """
+    html_summary = getattr(output, "html_summary", None)
+    if html_summary and re.search(r"<(html|body)\b", html_summary, re.IGNORECASE):
+        return HtmlOutput(agent_type="html", status="success", data=html_summary)
+    # Called directly so the report skips the LLM even when HTML_TEMPLATES_ENABLED is off
+    html = render_template(output)
+    if html is None:
+        return None
+    return HtmlOutput(agent_type="html", status="success", data=html)
+
+async def build_final_report(final_input: dict) -> dict:
+    """
+    Run the Final Output Agent over the collected input and render its answer.
+
+    Returns:
+    - The response sent back to the client for a "stop" payload
+    """
+    # Find the Final Output Agent in the list of agents
+    final_output_agent = None
+    for agent in agents:
+        if "Final Output Agent" in agent.name:
+            final_output_agent = agent
+            break
+    
+    # If we found the Final Output Agent, use it directly
+    if final_output_agent:
+        print(f"Using agent: {final_output_agent.name} for final summary")
+        
+        # Format input for the Final Output Agent
+        formatted_input = [{"content": json.dumps(final_input), "role": "user"}]
+        async with llm_semaphore:
+            result = await Runner.run(final_output_agent, input=formatted_input)
+        
+        final_output = render_final_report(result.final_output) if FINAL_REPORT_SINGLE_PASS else None
+        if final_output is not None:
+            final_report_renders["single_pass"] += 1
+        else:
+            async with llm_semaphore:
+                final_output = await html_transformer.atransform_to_html(result.final_output)
+            final_report_renders["transformer"] += 1
+        
+        return {
+            "type": "final_response", 
+            "data": final_output,
+            "pain_points": final_input["pain_points"],
+            "good_points": final_input["good_points"],
+            "last_agent": final_output_agent.name
+        }
+    else:
+        # Fall back to the supervisor if the Final Output Agent isn't found
+        print("Final Output Agent not found, using supervisor agent instead")
+        final_output = await supervisor_agent.process_input(final_input["conversation"])
+        
+        return {
+            "type": "response",
+            "data": final_output,
+            "pain_points": final_input["pain_points"],
+            "good_points": final_input["good_points"],
+            "last_agent": supervisor_agent.main_assistant.name
+        }
+
+async def draft_final_report(user_id: str):
+    """
+    Build the final report ahead of time from the session as it is now.
+
+    Returns:
+    - (fingerprint of the input the draft was built from, the report), or (None, None) if it failed
+    """
+    # Wait for this turn's points and summary so the draft matches what "stop" will see
+    await wait_for_pending_extractions(user_id)
+    summary_task = pending_summaries.get(user_id)
+    if summary_task is not None:
+        await asyncio.gather(summary_task, return_exceptions=True)
+
+    final_input = build_final_input(user_id, session_store.get(user_id))
+    try:
+        report = await build_final_report(final_input)
+    except Exception as e:
+        # "stop" builds the report itself when no usable draft is there
+        print(f"Error drafting final report: {e}")
+        return None, None
+    draft_stats["built"] += 1
+    return report_fingerprint(final_input), report
+
+def cancel_report_draft(user_id: str):
+    """
+    Drop the user's draft final report. Called when a new turn starts, since the draft is stale
+    from then on and would otherwise keep an LLM permit busy while the turn is answered.
+    """
+    draft = report_drafts.pop(user_id)
+    if draft is not None and not draft.done():
+        draft.cancel()
+        draft_stats["cancelled"] += 1
+
+def schedule_report_draft(user_id: str):
+    """
+    Replace the user's draft final report with one that includes the latest turn.
+    """
+    if not FINAL_REPORT_DRAFTS:
+        return
+    cancel_report_draft(user_id)
+    report_drafts.set(user_id, asyncio.create_task(draft_final_report(user_id)))
+
+def init_user_state(user_id: str):
+    """
+    Load the user's session, creating it or reloading it from disk if needed.
+    """
+    return session_store.get(user_id)
+
+def build_prompt_text(user_id: str, prompt_text: str) -> str:
+    """
+    Prepend the user's stored data to the prompt so the agents can personalize their answer.
+    """
+    # Retrieve user data for the user
+    user_data_for_user = profile_store.get(user_id)
+    print(user_data_for_user, user_id)
+
+    formatted_user_data = json.dumps(user_data_for_user, indent=2, ensure_ascii=False)
+    user_context = f"Información de usuario:\n```json\n{formatted_user_data}\n```\n"
+
+    print(f"User context: {user_context}")
+
+    # Append user data to the prompt text
+    return user_context + prompt_text
+
+def record_prompt_turn(user_id: str, user_message: str, html_output) -> dict:
+    """
+    Store a finished prompt turn in the history and build the response sent back to the client.
+    Only the user's own message and the readable text of the answer are kept.
+    """
+    # Store conversation for future reference
+    session = session_store.get(user_id)
+    session_store.add_turn(session, "user", user_message)
+    session_store.add_turn(session, "assistant", html_to_text(html_output.data or ""))
+    schedule_summary_update(user_id)
+    schedule_report_draft(user_id)
+
+    return {
+        "type": "response",
+        "user_id": user_id,
+        "data": html_output,  # Return the HTML output directly
+        "pain_points": session.pain_points.labels(),
+        "good_points": session.good_points.labels(),
+    }
+
+async def handle_conversation_stream(payload: dict):
+    """
+    Streaming variant of handle_conversation.
+
+    "prompt" turns yield the supervisor events as they happen ("agent" on every handoff,
+    "delta" for partial model text, "html" once the answer is rendered) and finish with a
+    "final" event carrying the same response handle_conversation returns. Other payload
+    types are answered with a single "final" event.
+
+    Yields:
+    - Tuples of (event name, event data)
+    """
+    if payload.get("type") != "prompt" or not payload.get("user_id") or not payload.get("data"):
+        yield "final", await handle_conversation(payload)
+        return
+
+    user_id = payload["user_id"]
+    init_user_state(user_id)
+    cancel_report_draft(user_id)
+    prompt_text = build_prompt_text(user_id, payload["data"])
+
+    extraction = None
+    if POINT_EXTRACTION_MODE != "background":
+        # Extraction runs while the answer streams and is merged before the final event
+        extraction = asyncio.create_task(extract_points_from_response(payload["data"]))
+    else:
+        # Started up front so the message is scanned even if the client goes away mid-stream
+        schedule_point_extraction(user_id, payload["data"])
+
+    html_output = None
+    try:
+        async for event, data in supervisor_agent.process_input_streamed(prompt_text, route_text=payload["data"]):
+            if event == "html":
+                html_output = data
+                yield event, {"html": data.data}
+            else:
+                yield event, data
+    except Exception as e:
+        print(f"Error streaming prompt: {str(e)}")
+
+    if extraction is not None:
+        merge_points(user_id, await extraction)
+
+    if html_output is None:
+        # Provide a safe fallback response
+        html_output = BaseAgentOutput(agent_type="html", status="success", data="Entiendo. ¿Hay algo más en lo que pueda ayudarte?")
+
+    yield "final", record_prompt_turn(user_id, payload["data"], html_output)
 
 async def handle_conversation(payload: dict) -> dict:
     """
@@ -166,31 +590,21 @@ async def handle_conversation(payload: dict) -> dict:
     user_id = payload.get("user_id")  # Unique identifier for the user
     if not user_id:
         return {"error": "User ID is required", "status_code": 400}
+    # Checked before the session is created, so malformed messages never leave one behind
+    if payload_type not in ("start", "prompt", "stop"):
+        return {"error": "Invalid type in payload", "status_code": 400}
+    if payload_type == "prompt" and not payload.get("data"):
+        return {"error": "Prompt text is required for type 'prompt'", "status_code": 400}
 
-    global user_data
-    # Initialize conversation history, pain points, and user data for the user if not already present
-    if user_id not in conversation_histories:
-        conversation_histories[user_id] = []
-    if user_id not in user_pain_points:
-        user_pain_points[user_id] = []
-    if user_id not in user_good_points:
-        user_good_points[user_id] = []
-    if user_id not in user_data:
-        user_data[user_id] = {}  # Ensure user_data is initialized
-
-# # Load user data dynamically to ensure the latest state
-#     global user_data
-#     user_data = load_user_data()
-
+    session = init_user_state(user_id)
 
     # Handle the start of the conversation
     if payload_type == "start":
-        user_data_for_user = payload.get("user_data", {})  # Use a local variable to avoid shadowing the global dictionary
-        user_data[user_id].update(user_data_for_user)  # Update user data for future reference
-        save_user_data()  # Save updated user data to the file
+        # Update user data for future reference, only this user's record is written
+        user_data_for_user = profile_store.update(user_id, payload.get("user_data", {}))
         
         # Format the user data as JSON, but avoid potential policy triggers
-        formatted_user_data = json.dumps(user_data[user_id], indent=2, ensure_ascii=False)
+        formatted_user_data = json.dumps(user_data_for_user, indent=2, ensure_ascii=False)
         user_context = f"Información de usuario:\n```json\n{formatted_user_data}\n```\n"
         user_context += "Inicia una conversación amable en español con esta persona. "
         user_context += "Pregunta sobre cómo puedes ayudarle hoy. No utilices ningún agente especializado."
@@ -198,20 +612,21 @@ async def handle_conversation(payload: dict) -> dict:
 
         try:
             # Process the user context through the supervisor
-            result = client.chat.completions.create(
-                model=llm_model_name,
-                messages=[
-                    {"role": "system", "content": user_context}
-                ]
-            )
+            async with llm_semaphore:
+                result = await openai_client.chat.completions.create(
+                    model=llm_model_name,
+                    messages=[
+                        {"role": "system", "content": user_context}
+                    ]
+                )
 
             output = result.choices[0].message.content
 
             print(f"Initial conversation output: {output}")
 
-            # Store conversation for future reference
-            conversation_histories[user_id].append({"content": user_context, "role": "user"})
-            conversation_histories[user_id].append({"content": output, "role": "assistant"})
+            # Store the greeting for future reference, the user data is passed to the final report separately
+            session = session_store.get(user_id)
+            session_store.add_turn(session, "assistant", output)
             
             return {
                 "type": "response",
@@ -226,8 +641,8 @@ async def handle_conversation(payload: dict) -> dict:
             # Provide a safe fallback response
             fallback_response = "Hola, ¿en qué puedo ayudarte hoy?"
             
-            conversation_histories[user_id].append({"content": user_context, "role": "user"})
-            conversation_histories[user_id].append({"content": fallback_response, "role": "assistant"})
+            session = session_store.get(user_id)
+            session_store.add_turn(session, "assistant", fallback_response)
             
             return {
                 "type": "response",
@@ -240,180 +655,89 @@ async def handle_conversation(payload: dict) -> dict:
 
     # Handle sequential prompts
     elif payload_type == "prompt":
-        prompt_text = payload.get("data", "")
-        if not prompt_text:
-            return {"error": "Prompt text is required for type 'prompt'", "status_code": 400}
-
-        user_data = load_user_data()
-        print(user_data, user_id)
-        print (user_data.get(user_id, {}))
-
-        # Retrieve user data for the user
-        formatted_user_data = json.dumps(user_data.get(user_id, {}), indent=2, ensure_ascii=False)
-        user_context = f"Información de usuario:\n```json\n{formatted_user_data}\n```\n"
-
-        print(f"User context: {user_context}")
-
-        # Append user data to the prompt text
-        prompt_text = user_context + prompt_text
+        cancel_report_draft(user_id)
+        prompt_text = build_prompt_text(user_id, payload["data"])
 
         try:
-            # Extract pain points using the new function
-            points = await extract_points_from_response(prompt_text)
-
-            new_pain_points = [point.capitalize() for point in points.pain_points]
-            new_good_points = [point.capitalize() for point in points.good_points]
-
-            print(f"Extracted pain points: {new_pain_points} from user_id: {user_id}")
-            
-            # Append new pain points to the user's existing pain points
-            user_pain_points[user_id].extend(new_pain_points)
-            user_pain_points[user_id] = list(set(user_pain_points[user_id]))  # Ensure uniqueness
-
-            # Append new good points to the user's existing good points
-            user_good_points[user_id].extend(new_good_points)
-            user_good_points[user_id] = list(set(user_good_points[user_id]))  # Ensure uniqueness
-            
-            # Process the user input through the supervisor agent
-            html_output = await supervisor_agent.process_input(prompt_text)
-
-            # Store conversation for future reference
-            conversation_histories[user_id].append({"content": prompt_text, "role": "user"})
-            conversation_histories[user_id].append({"content": html_output, "role": "assistant"})
-
-            save_user_data()  # Save updated user data to the file
-
-            return {
-                "type": "response",
-                "user_id": user_id,
-                "data": html_output,  # Return the HTML output directly
-                "pain_points": user_pain_points[user_id],
-                "good_points": user_good_points[user_id],
-            } 
+            if POINT_EXTRACTION_MODE == "background":
+                # Started before the answer so the message is scanned even if the LLM turn fails,
+                # the extracted points are merged once the background task finishes
+                schedule_point_extraction(user_id, payload["data"])
+                html_output = await supervisor_agent.process_input(prompt_text, route_text=payload["data"])
+            else:
+                # Extraction and routing are independent, so run them side by side
+                points, html_output = await asyncio.gather(
+                    extract_points_from_response(payload["data"]),
+                    supervisor_agent.process_input(prompt_text, route_text=payload["data"]),
+                    return_exceptions=True
+                )
+                if not isinstance(points, BaseException):
+                    merge_points(user_id, points)
+                if isinstance(html_output, BaseException):
+                    raise html_output
+
+            return record_prompt_turn(user_id, payload["data"], html_output)
         except Exception as e:
             print(f"Error processing prompt: {str(e)}")
             # Provide a safe fallback response
             fallback_response = "Entiendo. ¿Hay algo más en lo que pueda ayudarte?"
-            conversation_histories[user_id].append({"content": prompt_text, "role": "user"})
-            conversation_histories[user_id].append({"content": fallback_response, "role": "assistant"})
+            session = session_store.get(user_id)
+            session_store.add_turn(session, "user", payload["data"])
+            session_store.add_turn(session, "assistant", fallback_response)
+            schedule_summary_update(user_id)
+            schedule_report_draft(user_id)
             
             return {
                 "type": "response",
                 "user_id": user_id,
                 "data": BaseAgentOutput(agent_type="html", status="success", data=fallback_response),
-                "pain_points": user_pain_points[user_id],
-                "good_points": user_good_points[user_id],
+                "pain_points": session.pain_points.labels(),
+                "good_points": session.good_points.labels(),
             }
 
     # Handle the end of the conversation
     elif payload_type == "stop":
         # Generate a final report based on all previous conversation
-        
-        # Create a formatted string from the conversation history
-        conversation_text = ""
-        for entry in conversation_histories.get(user_id, []):
-            role = entry.get("role", "system")
-            content = entry.get("content", "")
-            conversation_text += f"{role.capitalize()}: {content}\n\n"
-
-        print(conversation_text)
+
+        # Make sure points from the last turns are in before summarizing
+        await wait_for_pending_extractions(user_id)
+
+        draft = report_drafts.pop(user_id)
+        if draft is not None:
+            # The draft already covers the latest turn unless it is still being built, so let it finish
+            await asyncio.gather(draft, return_exceptions=True)
+        else:
+            # A summary update still running would only save a few turns, use them verbatim instead
+            summary_task = pending_summaries.pop(user_id, None)
+            if summary_task is not None:
+                summary_task.cancel()
+
+        # The session is finished, take it out of the store
+        session = session_store.pop(user_id) or session
+        final_input = build_final_input(user_id, session)
+
+        print(final_input["conversation"])
         
         try:
-            user_data = load_user_data()
-            print(user_data, user_id)
-            print (user_data.get(user_id, {}))
-            
-            # Ensure user_data is initialized for the user
-            user_data_for_user = user_data.get(user_id, {})
-
-            # Find the Final Output Agent in the list of agents
-            final_output_agent = None
-            for agent in agents:
-                if "Final Output Agent" in agent.name:
-                    final_output_agent = agent
-                    break
-            
-            # If we found the Final Output Agent, use it directly
-            if final_output_agent:
-                print(f"Using agent: {final_output_agent.name} for final summary")
-                
-                # Prepare structured input for the Final Output Agent
-                final_input = {
-                    "conversation": conversation_text,
-                    "user_data": json.dumps(user_data_for_user, ensure_ascii=False),
-                    "pain_points": user_pain_points.get(user_id, []),
-                    "good_points": user_good_points.get(user_id, [])
-                }
-                
-                # Format input for the Final Output Agent
-                formatted_input = [{"content": json.dumps(final_input), "role": "user"}]
-                result = await Runner.run(final_output_agent, input=formatted_input)
-                
-                final_output = html_transformer.transform_to_html(result.final_output)
-                
-                # Clean up conversation history
-                conversation_histories.pop(user_id, None)
-                
-                return {
-                    "type": "final_response", 
-                    "data": final_output,
-                    "pain_points": user_pain_points.pop(user_id, []),
-                    "good_points": user_good_points.pop(user_id, []),
-                    "last_agent": final_output_agent.name
-                }
-            else:
-                # Fall back to the supervisor if the Final Output Agent isn't found
-                print("Final Output Agent not found, using supervisor agent instead")
-                final_output = await supervisor_agent.process_input(conversation_text)
-                # final_output = result.final_output
-                
-                # Clean up conversation history
-                conversation_histories.pop(user_id, None)
-                
-                return {
-                    "type": "response",
-                    "data": BaseAgentOutput(agent_type="html", status="success", data=final_output),
-                    "pain_points": user_pain_points.pop(user_id, []),
-                    "good_points": user_good_points.pop(user_id, []),
-                    "last_agent": supervisor_agent.main_assistant.name
-                }
+            if draft is not None:
+                if not draft.cancelled() and draft.exception() is None and draft.result()[0] == report_fingerprint(final_input):
+                    draft_stats["used"] += 1
+                    return draft.result()[1]
+                draft_stats["discarded"] += 1
+
+            return await build_final_report(final_input)
                 
         except Exception as e:
             print(f"Error processing final summary: {str(e)}")
             # Provide a safe fallback response
             fallback_response = "Gracias por tu consulta. Si necesitas más ayuda, no dudes en contactarnos nuevamente."
-            conversation_histories.pop(user_id, None)
             return {
                 "type": "response",
                 "data": fallback_response,
-                "pain_points": user_pain_points.pop(user_id, []),
-                "good_points": user_good_points.pop(user_id, [])
+                "pain_points": session.pain_points.labels(),
+                "good_points": session.good_points.labels()
             }
 
     # Handle invalid types
     else:
         return {"error": "Invalid type in payload", "status_code": 400}
-
-# Define the path for the user data JSON file
-USER_DATA_FILE = os.path.join(os.path.dirname(__file__), "user_data.json")
-
-def load_user_data():
-    """
-    Load user data from the JSON file. If the file does not exist or is invalid, return an empty dictionary.
-    """
-    if os.path.exists(USER_DATA_FILE):
-        try:
-            with open(USER_DATA_FILE, "r", encoding="utf-8") as file:
-                return json.load(file)
-        except json.JSONDecodeError:
-            print("Error decoding user data JSON file. Starting with an empty dictionary.")
-
-def save_user_data():
-    """
-    Save the current user data to the JSON file.
-    """
-    try:
-        with open(USER_DATA_FILE, "w", encoding="utf-8") as file:
-            json.dump(user_data, file, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f"Error saving user data to file: {e}")
\ No newline at end of file
@@ -1,2 +1,177 @@
-# Remove all manual HTML generation logic
-# This file can be deleted if no other functionality is required.
+"""
+Deterministic Tailwind templates for structured agent outputs.
+
+The HTMLTransformer asks render_template() first and only calls the LLM when no template
+applies, i.e. when the output has no structured fields beyond its free-form `data`.
+"""
+from html import escape
+
+# Output class name -> template function
+TEMPLATES = {}
+
+PAGE_TEMPLATE = (
+    "<!DOCTYPE html>"
+    "<html lang=\"es\">"
+    "<head>"
+    "<meta charset=\"utf-8\">"
+    "<meta name=\"viewport\" content=\"width=device-width, initial-scale=1\">"
+    "<script src=\"https://cdn.tailwindcss.com\"></script>"
+    "</head>"
+    "<body class=\"bg-gray-50 p-4\">"
+    "<div class=\"max-w-md mx-auto space-y-4\">{body}</div>"
+    "</body>"
+    "</html>"
+)
+
+
+def template(*output_type_names: str):
+    """
+    Register a template function for the given output class names.
+    The function returns the page body, or None when the output has nothing structured to show.
+    """
+    def register(func):
+        for name in output_type_names:
+            TEMPLATES[name] = func
+        return func
+    return register
+
+
+def render_template(output):
+    """
+    Render an agent output with its registered template.
+
+    Parameters:
+    - output: The pydantic agent output
+
+    Returns:
+    - A complete HTML document, or None if the LLM should render it instead
+    """
+    func = TEMPLATES.get(type(output).__name__)
+    if func is None:
+        return None
+    body = func(output)
+    if body is None:
+        return None
+    return PAGE_TEMPLATE.format(body=body)
+
+
+def card(title: str, content: str) -> str:
+    return (
+        "<section class=\"bg-white rounded-2xl shadow p-4\">"
+        f"<h2 class=\"text-lg font-semibold text-gray-800 mb-2\">{escape(title)}</h2>"
+        f"{content}"
+        "</section>"
+    )
+
+
+def paragraphs(text) -> str:
+    if not text:
+        return ""
+    return "".join(
+        f"<p class=\"text-gray-700 leading-relaxed mb-2\">{escape(line.strip())}</p>"
+        for line in str(text).splitlines() if line.strip()
+    )
+
+
+def bullet_list(items, marker_class: str = "bg-blue-500") -> str:
+    if not items:
+        return ""
+    rows = "".join(
+        "<li class=\"flex items-start gap-2\">"
+        f"<span class=\"mt-2 h-2 w-2 shrink-0 rounded-full {marker_class}\"></span>"
+        f"<span class=\"text-gray-700\">{escape(str(item))}</span>"
+        "</li>"
+        for item in items
+    )
+    return f"<ul class=\"space-y-2\">{rows}</ul>"
+
+
+def definition_table(rows) -> str:
+    cells = "".join(
+        "<tr class=\"border-b last:border-0\">"
+        f"<th class=\"py-2 pr-4 text-left text-sm font-medium text-gray-500\">{escape(str(label))}</th>"
+        f"<td class=\"py-2 text-sm text-gray-800\">{escape(str(value))}</td>"
+        "</tr>"
+        for label, value in rows if value not in (None, "")
+    )
+    if not cells:
+        return ""
+    return f"<table class=\"w-full\"><tbody>{cells}</tbody></table>"
+
+
+@template("EnergyAgentOutput")
+def render_energy(output):
+    if not output.tips:
+        return None
+    body = card("Energía y sostenibilidad", paragraphs(output.data) + definition_table([("País", output.country)]))
+    body += card("Consejos", bullet_list(output.tips, "bg-green-500"))
+    return body
+
+
+@template("ClimateAgentOutput")
+def render_climate(output):
+    has_location = output.latitude is not None and output.longitude is not None
+    if not has_location and not output.risk:
+        return None
+
+    body = card("Clima y medio ambiente", paragraphs(output.data))
+    if output.risk:
+        body += card(
+            "Riesgos ambientales",
+            f"<div class=\"rounded-xl bg-amber-50 border border-amber-200 p-3 text-amber-900\">{escape(output.risk)}</div>",
+        )
+    if has_location:
+        lat, lon = output.latitude, output.longitude
+        bbox = f"{lon - 0.5},{lat - 0.5},{lon + 0.5},{lat + 0.5}"
+        body += card(
+            "Ubicación",
+            definition_table([("Latitud", f"{lat:.4f}"), ("Longitud", f"{lon:.4f}")])
+            + "<iframe class=\"mt-3 w-full h-56 rounded-xl border-0\" loading=\"lazy\" "
+            f"src=\"https://www.openstreetmap.org/export/embed.html?bbox={bbox}&amp;layer=mapnik&amp;marker={lat},{lon}\"></iframe>",
+        )
+    return body
+
+
+PAYMENT_STATUS_STYLES = {
+    "success": "bg-green-100 text-green-800",
+    "error": "bg-red-100 text-red-800",
+}
+
+
+@template("PaymentAgentOutput")
+def render_payment(output):
+    if not output.transaction_id and not output.message:
+        return None
+
+    status = output.status or "pending"
+    badge_class = PAYMENT_STATUS_STYLES.get(status.lower(), "bg-yellow-100 text-yellow-800")
+    badge = f"<span class=\"inline-block rounded-full px-3 py-1 text-sm font-medium {badge_class}\">{escape(status)}</span>"
+    body = card(
+        "Pago",
+        f"<div class=\"mb-3\">{badge}</div>"
+        + definition_table([("Transacción", output.transaction_id), ("Mensaje", output.message)])
+        + paragraphs(output.data),
+    )
+    return body
+
+
+@template("FinalOutputAgentOutput")
+def render_final_output(output):
+    if not output.problems and not output.recommendations and not output.html_summary:
+        return None
+
+    body = ""
+    if output.html_summary:
+        # The summary is generated as HTML by the Final Output Agent itself
+        body += card("Resumen", f"<div class=\"text-gray-700\">{output.html_summary}</div>")
+    elif output.data:
+        body += card("Resumen", paragraphs(output.data))
+    if output.problems:
+        body += card("Problemas Identificados", bullet_list(output.problems, "bg-red-500"))
+    if output.recommendations:
+        body += card("Recomendaciones", bullet_list(output.recommendations, "bg-green-500"))
+    if output.user_data:
+        user_rows = definition_table(output.user_data.items())
+        if user_rows:
+            body += card("Datos del Usuario", user_rows)
+    return body
@@ -1,11 +1,24 @@
-from fastapi import FastAPI, File, UploadFile, Form, Body
+from fastapi import FastAPI, Form, Body, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware  # Import CORS middleware
+from fastapi.encoders import jsonable_encoder
 from typing import Union, Optional  # Import Optional for type hinting
-import io
-from agent_manager import supervisor_agent, handle_conversation  # Import supervisor_agent and handle_conversation
+from agent_manager import supervisor_agent, handle_conversation, handle_conversation_stream, html_transformer, profile_store, session_store, summarizer, draft_stats, final_report_renders, point_extraction_stats, point_batcher, point_analytics  # Import supervisor_agent and handle_conversation
 from settings import get_settings_ui, update_settings, load_whisper_model_name  # Import settings functions
+from utils.concurrency import run_blocking
+from utils.perplexity_api import get_search_stats, init_perplexity_client, close_perplexity_client
+from utils.http_client import get_http_stats, init_http_client, close_http_client
+from utils.worldbank_store import worldbank_store
+from utils.transcription_pool import TranscriptionBusyError, TranscriptionTimeoutError
+from utils.whisper_registry import WhisperModelRegistry
+from utils.audio_upload import receive_audio_form, check_content_length, UploadTooLargeError, InvalidUploadError
+from utils.audio_segmenter import split_audio, stitch_transcripts, SEGMENT_PARALLELISM
+from utils.live_transcription import LiveTranscriber, LIVE_MIN_SAMPLE_RATE, LIVE_MAX_SAMPLE_RATE
+from utils.audio_upload import AUDIO_MAX_UPLOAD_BYTES
 import random
+import json
+import asyncio
+import shutil
 
 from dotenv import load_dotenv
 import os
@@ -17,13 +30,8 @@ from groq import Groq
 USE_LOCAL_WHISPER_API = os.environ.get("USE_LOCAL_WHISPER_API", "false").lower() == "true"
 
 
-if USE_LOCAL_WHISPER_API:
-    import whisper  
-    
-
 from openai.types.responses import ResponseContentPartDoneEvent, ResponseTextDeltaEvent
 # from html_templates import generate_html_from_json  # Import the HTML templates module
-import tempfile # Import the tempfile module for temporary file handling
 
 # Set up Groq client
 client = Groq(
@@ -44,23 +52,80 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Endpoints receiving audio uploads
+AUDIO_UPLOAD_PATHS = {"/audio-input/", "/audio-input/stream/"}
+
+# The audio endpoints parse their multipart body themselves, so their form is documented here
+AUDIO_FORM_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file", "user_id"],
+                    "properties": {
+                        "file": {"type": "string", "format": "binary"},
+                        "user_id": {"type": "string"},
+                        "tier": {"type": "string", "description": "Optional \"fast\" or \"accurate\" (local Whisper)"},
+                    },
+                }
+            }
+        },
+    }
+}
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """
+    Refuse audio uploads whose declared size is over the limit before the body is read.
+    """
+    if request.method == "POST" and request.url.path in AUDIO_UPLOAD_PATHS:
+        try:
+            check_content_length(request.headers.get("content-length"))
+        except UploadTooLargeError as e:
+            return JSONResponse(content={"error": str(e)}, status_code=413)
+    return await call_next(request)
+
+@app.on_event("startup")
+async def startup():
+    # Create long-lived upstream clients once so their connection pools are reused
+    init_perplexity_client()
+    init_http_client()
+    if whisper_registry is not None:
+        # Load the default Whisper model in the background, audio requests get a 503 until it is ready
+        whisper_registry.load(whisper_registry.default_model)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await close_perplexity_client()
+    await close_http_client()
+    # Write any batched profile changes before the worker exits
+    profile_store.close()
+    session_store.close()
+    point_analytics.close()
+    if whisper_registry is not None:
+        whisper_registry.close()
+
+# Local Whisper runs in a pool of workers, each with its own copy of the model
+whisper_registry = None
 if USE_LOCAL_WHISPER_API:
-    # Load the Whisper model dynamically
-    def load_whisper_model():
-        model_name = load_whisper_model_name()
-        return whisper.load_model(model_name)
+    whisper_registry = WhisperModelRegistry(load_whisper_model_name())
 
-    whisper_model = load_whisper_model()
+# Texts returned in place of a transcription when it fails
+GROQ_TRANSCRIPTION_FAILED = "Transcription failed with Groq."
+LOCAL_TRANSCRIPTION_FAILED = "Transcription failed"
 
 # Function to transcribe audio using Groq's Whisper API
 def transcribe_audio_with_groq(audio_file_path: str) -> str:
     """
     Transcribe audio using Groq's Whisper implementation.
+    The file is streamed into the request body instead of being read into memory first.
     """
     try:
         with open(audio_file_path, "rb") as file:
             transcription = client.audio.transcriptions.create(
-                file=(os.path.basename(audio_file_path), file.read()),
+                file=(os.path.basename(audio_file_path), file),
                 model="whisper-large-v3",
                 prompt="""Transcribe the audio to text. Always respond in Spanish.""",
                 response_format="text",
@@ -69,44 +134,96 @@ def transcribe_audio_with_groq(audio_file_path: str) -> str:
         return transcription  # This is now directly the transcription text
     except Exception as e:
         print(f"An error occurred with Groq transcription: {str(e)}")
-        return "Transcription failed with Groq."
+        return GROQ_TRANSCRIPTION_FAILED
 
 # Updated function to transcribe audio using the selected method
-def transcribe_audio(audio_file: io.BytesIO) -> str:
+async def transcribe_audio(audio_file_path: str, tier: str = None) -> str:
     """
     Transcribes audio using either the local Whisper model or Groq's Whisper API based on configuration.
+    Long recordings are split at silences and their segments transcribed in parallel, falling
+    back to a single pass if the recording cannot be split (e.g. ffmpeg is not installed).
+    """
+    try:
+        split = await split_audio(audio_file_path)
+    except Exception as e:
+        print(f"Could not split audio, transcribing in one pass: {e}")
+        split = None
+    if split is None:
+        return await transcribe_segment(audio_file_path, tier)
+
+    segments_dir, segment_paths = split
+    semaphore = asyncio.Semaphore(SEGMENT_PARALLELISM)
+
+    async def transcribe_limited(segment_path: str) -> str:
+        async with semaphore:
+            return await transcribe_segment(segment_path, tier)
+
+    try:
+        # Let every segment finish before the files are removed, then report the first error
+        texts = await asyncio.gather(*[transcribe_limited(path) for path in segment_paths], return_exceptions=True)
+    finally:
+        shutil.rmtree(segments_dir, ignore_errors=True)
+    for text in texts:
+        if isinstance(text, BaseException):
+            raise text
+
+    # A failed segment only loses its own words
+    texts = [text for text in texts if text not in (GROQ_TRANSCRIPTION_FAILED, LOCAL_TRANSCRIPTION_FAILED)]
+    if not texts:
+        return LOCAL_TRANSCRIPTION_FAILED if USE_LOCAL_WHISPER_API else GROQ_TRANSCRIPTION_FAILED
+    return stitch_transcripts(texts)
+
+async def transcribe_segment(audio_file_path: str, tier: str = None) -> str:
+    """
+    Transcribe one file in a single pass without blocking the event loop: local inference runs
+    on the transcription pool and the Groq call on a worker thread.
     """
     if USE_LOCAL_WHISPER_API:
         print("Using local Whisper model for transcription.")
-        audio_file.seek(0)  # Ensure the file pointer is at the beginning
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
-            temp_audio.write(audio_file.read())
-            temp_audio_path = temp_audio.name
-        result = whisper_model.transcribe(temp_audio_path)
-        os.unlink(temp_audio_path)  # Clean up temporary file
-        print(result)
-        return result.get("text", "Transcription failed")
+        transcription = await whisper_registry.transcribe(audio_file_path, tier)
+        print(transcription)
+        return transcription or LOCAL_TRANSCRIPTION_FAILED
     else:
         print("Using Groq's Whisper API for transcription.")
-        # Save the input audio file temporarily
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
-            temp_audio.write(audio_file.read())
-            temp_audio_path = temp_audio.name
-        transcription = transcribe_audio_with_groq(temp_audio_path)
-        os.unlink(temp_audio_path)  # Clean up temporary file
-        return transcription
-        
+        return await run_blocking(transcribe_audio_with_groq, audio_file_path)
 
-async def process(payload: dict, transcribed_text: str = None):
+async def transcribe_upload(request: Request):
     """
-    Process the conversation based on the provided payload.
+    Receive an audio upload (form fields "file", "user_id" and optional "tier") and transcribe it.
+    With local Whisper, tier ("fast" or "accurate") picks the model size.
+
+    Returns:
+    - (transcribed text, user_id, None), or (None, None, JSONResponse) if the upload is invalid or
+      too large, or the transcription pool is busy or timed out
     """
-    # Handle the conversation using the supervisor agent
-    response = await handle_conversation(payload)
+    # The audio goes from the socket straight into the single temporary file both transcription paths read from
+    try:
+        audio_file_path, fields = await receive_audio_form(request)
+    except UploadTooLargeError as e:
+        return None, None, JSONResponse(content={"error": str(e)}, status_code=413)
+    except InvalidUploadError as e:
+        return None, None, JSONResponse(content={"error": str(e)}, status_code=422)
+    try:
+        user_id = fields.get("user_id")
+        if not user_id:
+            return None, None, JSONResponse(content={"error": "User ID is required"}, status_code=422)
+        return await transcribe_audio(audio_file_path, fields.get("tier")), user_id, None
+    except TranscriptionBusyError as e:
+        return None, None, JSONResponse(content={"error": str(e)}, status_code=503)
+    except TranscriptionTimeoutError as e:
+        return None, None, JSONResponse(content={"error": str(e)}, status_code=504)
+    finally:
+        os.unlink(audio_file_path)  # Clean up temporary file
+        
 
+def build_client_response(payload: dict, response: dict, transcribed_text: str = None) -> dict:
+    """
+    Shape a conversation handler response into what the frontend expects.
+    Errors are returned as {"error": ..., "status_code": ...}.
+    """
     # Handle errors returned by the conversation handler
     if "error" in response:
-        return JSONResponse(content={"error": response["error"]}, status_code=response.get("status_code", 400))
+        return {"error": response["error"], "status_code": response.get("status_code", 400)}
 
     # # Check if the response is from the main agent and set agent_type to "main"
     # if "last_agent" not in response:
@@ -118,7 +235,7 @@ async def process(payload: dict, transcribed_text: str = None):
     base_agent_response = response.get("data", {})
     # Check if the response contains a "data" key
     if not base_agent_response:
-        return JSONResponse(content={"error": "No data found in the response."}, status_code=400)
+        return {"error": "No data found in the response.", "status_code": 400}
     
     print(base_agent_response)
     
@@ -134,6 +251,50 @@ async def process(payload: dict, transcribed_text: str = None):
         "good_points": response.get("good_points"),
         "transcribed_text": transcribed_text if transcribed_text else None
     }
+
+async def process(payload: dict, transcribed_text: str = None):
+    """
+    Process the conversation based on the provided payload.
+    """
+    # Handle the conversation using the supervisor agent
+    response = await handle_conversation(payload)
+
+    client_response = build_client_response(payload, response, transcribed_text)
+    if "error" in client_response:
+        return JSONResponse(content={"error": client_response["error"]}, status_code=client_response["status_code"])
+
+    return client_response
+
+def format_sse(event: str, data) -> str:
+    """
+    Encode a single server-sent event.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def process_stream(payload: dict, transcribed_text: str = None):
+    """
+    Stream the conversation as server-sent events.
+
+    Events: "transcription" (audio only), "agent" on every handoff, "delta" with partial text,
+    "html_chunk" with renderable pieces of the HTML, "html" with the rendered answer, and a closing "final" (or "error") with the same body
+    the non-streaming endpoints return.
+    """
+    if transcribed_text is not None:
+        yield format_sse("transcription", {"text": transcribed_text})
+
+    async for event, data in handle_conversation_stream(payload):
+        if event == "final":
+            client_response = build_client_response(payload, data, transcribed_text)
+            yield format_sse("error" if "error" in client_response else "final", client_response)
+        else:
+            yield format_sse(event, data)
+
+def sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # Keep proxies from buffering the stream
+    )
  
 @app.post("/process-input/")
 async def process_input(payload: dict = Body(...)):
@@ -143,16 +304,16 @@ async def process_input(payload: dict = Body(...)):
     return await process(payload)
     
 
-@app.post("/audio-input/")
-async def audio_input(file: UploadFile = File(...), user_id: str = Form(...)):
+@app.post("/audio-input/", openapi_extra=AUDIO_FORM_OPENAPI)
+async def audio_input(request: Request):
     """
     Endpoint to handle audio input, transcribe it to text, and process it with the AI.
+    With local Whisper, tier ("fast" or "accurate") picks the model size.
     """
-    # Read the uploaded audio file
-    audio_bytes = io.BytesIO(await file.read())
-    
-    # Transcribe the audio to text
-    transcribed_text = transcribe_audio(audio_bytes)
+    # Transcribe the audio to text off the event loop so other requests keep flowing
+    transcribed_text, user_id, error_response = await transcribe_upload(request)
+    if error_response is not None:
+        return error_response
     
     # Create a payload for the conversation handler
     payload = {
@@ -163,6 +324,123 @@ async def audio_input(file: UploadFile = File(...), user_id: str = Form(...)):
 
     return await process(payload, transcribed_text)
 
+@app.post("/process-input/stream/")
+async def process_input_stream(payload: dict = Body(...)):
+    """
+    Streaming variant of /process-input/ using server-sent events.
+    """
+    return sse_response(process_stream(payload))
+
+@app.post("/audio-input/stream/", openapi_extra=AUDIO_FORM_OPENAPI)
+async def audio_input_stream(request: Request):
+    """
+    Streaming variant of /audio-input/ using server-sent events.
+    """
+    # Transcribe the audio to text off the event loop so other requests keep flowing
+    transcribed_text, user_id, error_response = await transcribe_upload(request)
+    if error_response is not None:
+        return error_response
+
+    payload = {
+        "type": "prompt",
+        "user_id": user_id,
+        "data": transcribed_text
+    }
+
+    return sse_response(process_stream(payload, transcribed_text))
+
+async def transcribe_live_segment(audio_file_path: str, tier: str = None) -> str:
+    text = await transcribe_segment(audio_file_path, tier)
+    return "" if text in (GROQ_TRANSCRIPTION_FAILED, LOCAL_TRANSCRIPTION_FAILED) else text
+
+@app.websocket("/ws/audio-input/")
+async def audio_input_live(websocket: WebSocket):
+    """
+    Live voice input: audio is transcribed while the user speaks.
+
+    Protocol:
+    - Client sends {"type": "start", "user_id": ..., "sample_rate": 16000, "tier": "fast"} as text
+    - Client sends the microphone audio as binary frames of 16-bit little-endian mono PCM
+    - Server sends {"type": "partial", "index": n, "text": ...} as each utterance is transcribed
+    - Client sends {"type": "stop"} when the user stops speaking
+    - Server sends {"type": "transcription", "text": ...}, then the same body /audio-input/
+      returns with "type" kept as-is, or {"type": "error", "error": ...}, and closes
+    """
+    await websocket.accept()
+    transcriber = None
+    try:
+        start = await websocket.receive_json()
+        user_id = start.get("user_id")
+        if start.get("type") != "start" or not user_id:
+            await websocket.send_json({"type": "error", "error": "Expected a start message with a user_id"})
+            await websocket.close()
+            return
+
+        try:
+            sample_rate = int(start.get("sample_rate", 16000))
+        except (TypeError, ValueError):
+            sample_rate = 0
+        if not LIVE_MIN_SAMPLE_RATE <= sample_rate <= LIVE_MAX_SAMPLE_RATE:
+            await websocket.send_json({
+                "type": "error",
+                "error": f"sample_rate must be between {LIVE_MIN_SAMPLE_RATE} and {LIVE_MAX_SAMPLE_RATE}",
+            })
+            await websocket.close()
+            return
+
+        async def send_partial(index: int, text: str):
+            await websocket.send_json({"type": "partial", "index": index, "text": text})
+
+        tier = start.get("tier")
+
+        async def transcribe(audio_file_path: str) -> str:
+            return await transcribe_live_segment(audio_file_path, tier)
+
+        transcriber = LiveTranscriber(
+            transcribe,
+            sample_rate=sample_rate,
+            on_partial=send_partial,
+            max_bytes=AUDIO_MAX_UPLOAD_BYTES,
+        )
+
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes") is not None:
+                transcriber.feed(message["bytes"])
+            elif message.get("text") is not None and json.loads(message["text"]).get("type") == "stop":
+                break
+
+        # Only the last utterance is usually still being transcribed at this point
+        transcribed_text = await transcriber.finish()
+        await websocket.send_json({"type": "transcription", "text": transcribed_text})
+
+        if not transcribed_text:
+            await websocket.send_json({"type": "error", "error": "No speech detected"})
+        else:
+            payload = {
+                "type": "prompt",
+                "user_id": user_id,
+                "data": transcribed_text
+            }
+            response = await handle_conversation(payload)
+            client_response = build_client_response(payload, response, transcribed_text)
+            if "error" in client_response:
+                await websocket.send_json({"type": "error", "error": client_response["error"]})
+            else:
+                await websocket.send_json(jsonable_encoder(client_response))
+    except WebSocketDisconnect:
+        # The user went away, stop transcribing for them
+        if transcriber is not None:
+            transcriber.cancel()
+        return
+    except (ValueError, TranscriptionBusyError, TranscriptionTimeoutError) as e:
+        if transcriber is not None:
+            transcriber.cancel()
+        await websocket.send_json({"type": "error", "error": str(e)})
+    await websocket.close()
+
 @app.get("/settings/", response_class=HTMLResponse)
 async def settings_ui():
     return get_settings_ui(supervisor_agent)
@@ -176,14 +454,52 @@ async def settings_update(
     """
     Endpoint to update the settings for the supervisor, final output agent, and Whisper model.
     """
-    global whisper_model  # Declare whisper_model as global
     if whisper_model_param:  # Only update the Whisper model if a value is provided
         response = await update_settings(supervisor_agent, prompt, final_output_prompt, whisper_model_param)
-        whisper_model = load_whisper_model()  # Reload the Whisper model with the new settings
+        if whisper_registry is not None:
+            # The new model loads in the background and replaces the current one once it is ready
+            whisper_registry.set_default(load_whisper_model_name())
     else:
         response = await update_settings(supervisor_agent, prompt, final_output_prompt, "")
     return response
 
+@app.get("/stats/")
+async def stats():
+    """
+    Cache and performance counters for monitoring.
+    """
+    return {
+        "html_transformer": html_transformer.stats(),
+        "pre_router": supervisor_agent.pre_router.stats(),
+        "perplexity": get_search_stats(),
+        "http_tools": get_http_stats(),
+        "worldbank_store": worldbank_store.stats(),
+        "profile_store": profile_store.stats(),
+        "session_store": session_store.stats(),
+        "conversation_summary": summarizer.stats(),
+        "point_extraction": point_extraction_stats,
+        "point_batcher": point_batcher.stats(),
+        "point_analytics": point_analytics.stats(),
+        "final_report_drafts": draft_stats,
+        "final_report_renders": final_report_renders,
+        "whisper_models": whisper_registry.stats() if whisper_registry is not None else None,
+    }
+
+@app.get("/analytics/points/")
+async def analytics_points(segment: str = None):
+    """
+    Most mentioned pain and good points across users, for dashboards.
+
+    Parameters:
+    - segment: Optional "all", "country:<country>" or "age:<band>" (e.g. "age:25-34"), all segments if omitted
+    """
+    view = point_analytics.view()
+    if segment is None:
+        return view
+    if segment not in view["segments"]:
+        return JSONResponse(content={"error": f"Unknown segment: {segment}"}, status_code=404)
+    return {"updated_at": view["updated_at"], "segments": {segment: view["segments"][segment]}}
+
 @app.post("/test-random-user/")
 async def test_random_user(first_prompt: str = Form(...)):
     """
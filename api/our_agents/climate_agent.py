@@ -1,5 +1,5 @@
 import asyncio
-import requests
+from utils.http_client import http_get
 from agents import Agent, function_tool
 import os
 from utils.perplexity_api import search_perplexity
@@ -15,7 +15,7 @@ class ClimateAgentOutput(BaseAgentOutput):
     risk: Optional[str] = None
 
 @function_tool
-def get_climate_data(lat: float, lon: float) -> dict:
+async def get_climate_data(lat: float, lon: float) -> dict:
     """
     Fetch climate data from NASA Earth Data API and return it as JSON.
     
@@ -29,7 +29,7 @@ def get_climate_data(lat: float, lon: float) -> dict:
     print("Climate Agent is accessing NASA Earth Data API.")
     try:
         url = f"https://api.nasa.gov/earth/temperature?lat={lat}&lon={lon}&api_key=LTty4H8UrdDVS1JeMtTijWxcWRS2QVChpQddl7hN"
-        response = requests.get(url)
+        response = await http_get(url, tool="get_climate_data")
         if response.status_code == 200:
             data = response.json()
             return {"agent_type": "climate", "status": "success", "latitude": lat, "longitude": lon, "data": data}
@@ -64,7 +64,7 @@ def get_environmental_risk(country: str) -> dict:
         return {"agent_type": "climate", "status": "error", "message": f"No hay información específica sobre riesgos ambientales para {country}."}
 
 @function_tool
-def search_climate_info(query: str) -> dict:
+async def search_climate_info(query: str) -> dict:
     """
     Search for climate information using the Perplexity API.
     
@@ -75,7 +75,7 @@ def search_climate_info(query: str) -> dict:
     - Search results in JSON format
     """
     print("Climate Agent is performing an internet search for climate information.")
-    result = search_perplexity(query)
+    result = await search_perplexity(query)
     return {"agent_type": "climate", **result}
 
 climate_agent = Agent(
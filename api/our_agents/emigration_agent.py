@@ -10,7 +10,7 @@ class EmigrationAgentOutput(BaseAgentOutput):
     # additional_info: Optional[str] = None
 
 @function_tool
-def search_emigration_info(query: str) -> dict:
+async def search_emigration_info(query: str) -> dict:
     """
     Search for emigration-related information using the Perplexity API.
     
@@ -21,7 +21,7 @@ def search_emigration_info(query: str) -> dict:
     - Search results in JSON format
     """
     print("Emigration Agent is performing an internet search for emigration-related information.")
-    result = search_perplexity(query)
+    result = await search_perplexity(query)
     return {"agent_type": "emigration", "data": result}
 
 emigration_agent = Agent(
@@ -1,5 +1,5 @@
 import asyncio
-import requests
+from utils.http_client import http_get
 from agents import Agent, function_tool
 from utils.perplexity_api import search_perplexity
 from our_agents_definition.base_agent import BaseAgentOutput, BASE_STARTING_PROMPT
@@ -13,7 +13,7 @@ class EnergyAgentOutput(BaseAgentOutput):
     tips: Optional[list[str]] = None
 
 @function_tool
-def get_renewable_energy_data(country: str) -> dict:
+async def get_renewable_energy_data(country: str) -> dict:
     """
     Fetch renewable energy data from IRENA and return it as JSON.
     
@@ -27,7 +27,7 @@ def get_renewable_energy_data(country: str) -> dict:
     try:
         # Placeholder for IRENA API - actual endpoint may differ
         url = f"https://api.irena.org/api/v1/data?country={country}&technology=all&format=json"
-        response = requests.get(url)
+        response = await http_get(url, tool="get_renewable_energy_data")
         if response.status_code == 200:
             data = response.json()
             return {"agent_type": "energy", "status": "success", "country": country, "data": data}
@@ -55,7 +55,7 @@ def get_energy_sustainability_tips() -> dict:
     return {"agent_type": "energy", "status": "success", "tips": tips}
 
 @function_tool
-def search_energy_info(query: str) -> dict:
+async def search_energy_info(query: str) -> dict:
     """
     Search for energy information using the Perplexity API.
     
@@ -66,7 +66,7 @@ def search_energy_info(query: str) -> dict:
     - Search results in JSON format
     """
     print("Energy Agent is performing an internet search for energy information.")
-    result = search_perplexity(query)
+    result = await search_perplexity(query)
     print(result)
     return {"agent_type": "energy", "data": result}
 
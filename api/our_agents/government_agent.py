@@ -11,7 +11,7 @@ class GovernmentAgentOutput(BaseAgentOutput):
     city: Optional[str] = None
 
 @function_tool
-def get_government_info(country: str, city: str, query: str) -> dict:
+async def get_government_info(country: str, city: str, query: str) -> dict:
     """
     Search for government-related information using the Perplexity API.
     
@@ -25,7 +25,7 @@ def get_government_info(country: str, city: str, query: str) -> dict:
     """
     print(f"Government Agent is searching for information about {query} in {city}, {country}.")
     full_query = f"{query} in {city}, {country} (laws, government processes, or related information)"
-    result = search_perplexity(full_query)
+    result = await search_perplexity(full_query)
     return {"agent_type": "government", "country": country, "city": city, "data": result}
 
 government_agent = Agent(
@@ -11,7 +11,7 @@ class HealthAgentOutput(BaseAgentOutput):
     # value: Optional[str] = None
 
 @function_tool
-def search_health_info(query: str) -> dict:
+async def search_health_info(query: str) -> dict:
     """
     Search for health information using the Perplexity API.
     
@@ -22,7 +22,7 @@ def search_health_info(query: str) -> dict:
     - Search results in JSON format
     """
     print("Health Agent is performing an internet search for health information.")
-    result = search_perplexity(query)
+    result = await search_perplexity(query)
     return {"agent_type": "health", "data": result}
 
 
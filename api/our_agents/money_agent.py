@@ -1,5 +1,6 @@
 import asyncio
-import requests
+from utils.http_client import http_get
+from utils.worldbank_store import worldbank_store
 from agents import Agent, function_tool
 from utils.perplexity_api import search_perplexity
 from our_agents_definition.base_agent import BaseAgentOutput, BASE_STARTING_PROMPT
@@ -29,21 +30,27 @@ def get_financial_advice(topic: str) -> dict:
     return {"agent_type": "money", "status": "success", "topic": topic, "advice": advice}
 
 @function_tool
-def get_world_bank_data(country_code: str, indicator: str) -> dict:
+async def get_world_bank_data(country_code: str, indicator: str) -> dict:
     """
     Fetch economic data from World Bank API and return it as JSON.
     
     Parameters:
-    - country_code: ISO 3166-1 alpha-3 country code
+    - country_code: ISO 3166-1 alpha-3 or alpha-2 country code
     - indicator: World Bank indicator code
     
     Returns:
     - Economic data in JSON format
     """
+    # Prefetched series are answered locally, the live API is only used on a miss or stale data
+    local = worldbank_store.lookup(country_code, indicator)
+    if local is not None:
+        year, value = local
+        return {"agent_type": "money", "status": "success", "country_code": country_code, "indicator": indicator, "value": value, "year": year}
+
     print("Money Agent is accessing World Bank API data.")
     try:
         url = f"https://api.worldbank.org/v2/country/{country_code}/indicator/{indicator}?format=json"
-        response = requests.get(url)
+        response = await http_get(url, tool="get_world_bank_data")
         if response.status_code == 200:
             data = response.json()
             if len(data) > 1 and len(data[1]) > 0:
@@ -56,7 +63,7 @@ def get_world_bank_data(country_code: str, indicator: str) -> dict:
         return {"agent_type": "money", "status": "error", "message": f"Error en la consulta: {str(e)}"}
 
 @function_tool
-def get_eclac_data(country_code: str, topic: str) -> dict:
+async def get_eclac_data(country_code: str, topic: str) -> dict:
     """
     Fetch socioeconomic data from the Economic Commission for Latin America and the Caribbean (ECLAC).
     
@@ -71,7 +78,7 @@ def get_eclac_data(country_code: str, topic: str) -> dict:
     try:
         # This is a placeholder since direct API access might require specific endpoints
         url = f"https://statistics.cepal.org/portal/cepalstat/api/v1/indicator?country={country_code}&topic={topic}&format=json"
-        response = requests.get(url)
+        response = await http_get(url, tool="get_eclac_data")
         if response.status_code == 200:
             data = response.json()
             return {"agent_type": "money", "status": "success", "country_code": country_code, "topic": topic, "data": data}
@@ -81,7 +88,7 @@ def get_eclac_data(country_code: str, topic: str) -> dict:
         return {"agent_type": "money", "status": "error", "message": f"Error en la consulta a la API de CEPAL: {str(e)}"}
 
 @function_tool
-def search_financial_info(query: str) -> dict:
+async def search_financial_info(query: str) -> dict:
     """
     Search for financial information using the Perplexity API.
     
@@ -92,7 +99,7 @@ def search_financial_info(query: str) -> dict:
     - Search results in JSON format
     """
     print("Money Agent is performing an internet search for financial information.")
-    result = search_perplexity(query)
+    result = await search_perplexity(query)
     return {"agent_type": "money", "data": result}
 
 
@@ -1,8 +1,13 @@
+import asyncio
+import random
 from typing import List, Dict, Any, Optional
 from agents import Agent, OpenAIChatCompletionsModel, RunResult
-from agents import Runner
+from agents import Runner, AgentUpdatedStreamEvent, RawResponsesStreamEvent, RunHooks, MaxTurnsExceeded
+from openai.types.responses import ResponseTextDeltaEvent
 from transformers.html_transformer import HTMLTransformer
 from our_agents_definition.base_agent import BaseAgentOutput, BASE_STARTING_PROMPT
+from utils.concurrency import llm_semaphore
+from utils.pre_router import PreRouter, PRE_ROUTER_ENABLED, PRE_ROUTER_AUDIT_RATE
 
 class MainAgentOutput(BaseAgentOutput):
     """
@@ -10,6 +15,49 @@ class MainAgentOutput(BaseAgentOutput):
     """
     # additional_info: Optional[str] = None  # Add any specific fields for the main agent if needed
 
+async def stream_with_llm_permit(open_stream):
+    """
+    Iterate an upstream stream while holding an llm_semaphore permit only for the upstream pulls.
+
+    A background task holding the permit drains open_stream() into an unbounded queue and releases
+    the permit as soon as upstream is done, however slowly the client reads what we yield.
+
+    Parameters:
+    - open_stream: Callable returning the async iterator, called once the permit is held
+    """
+    queue = asyncio.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async with llm_semaphore:
+                async for item in open_stream():
+                    queue.put_nowait(item)
+        finally:
+            queue.put_nowait(done)
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            yield item
+        await task  # Re-raises any upstream error
+    finally:
+        # The client went away: stop pulling from upstream
+        task.cancel()
+
+class HandoffRecorder(RunHooks):
+    """
+    Remembers the agent the Main Assistant hands off to.
+    """
+    def __init__(self):
+        self.target = None
+
+    async def on_handoff(self, context, from_agent, to_agent):
+        self.target = to_agent.name
+
 class Supervisor:
     def __init__(self, agents: List[Agent], model: OpenAIChatCompletionsModel, prompt: str, html_transformer: HTMLTransformer):
         self.agents = agents
@@ -28,12 +76,53 @@ class Supervisor:
             output_type=MainAgentOutput  # Use the base output type with optional extensions
         )
 
-    async def process_input(self, input_text: str) -> RunResult:
+        # Obvious messages skip the Main Assistant's routing round-trip
+        self.pre_router = PreRouter(agents)
+        self._audits = set()  # Background audit runs still in flight
+
+    def select_agent(self, input_text: str, route_text: str = None) -> Agent:
+        """
+        Return the agent that starts the run: a specialist picked by the pre-router, or the Main Assistant.
+
+        Parameters:
+        - input_text: The full input sent to the agent
+        - route_text: The user's own message to route on, without it the Main Assistant decides
+        """
+        if not PRE_ROUTER_ENABLED or not route_text:
+            return self.main_assistant
+        agent = self.pre_router.route(route_text)
+        if agent is None:
+            return self.main_assistant
+        if random.random() < PRE_ROUTER_AUDIT_RATE:
+            task = asyncio.create_task(self._audit_route(input_text, agent.name))
+            self._audits.add(task)
+            task.add_done_callback(self._audits.discard)
+        return agent
+
+    async def _audit_route(self, input_text: str, routed_name: str):
+        """
+        Ask the Main Assistant where it would have sent a routed message, stopping right after its choice.
+        """
+        recorder = HandoffRecorder()
+        try:
+            async with llm_semaphore:
+                # One turn is enough for the handoff decision, the specialist turn after it is cut off
+                await Runner.run(self.main_assistant, input=[{"content": input_text, "role": "user"}], max_turns=1, hooks=recorder)
+        except MaxTurnsExceeded:
+            pass
+        except Exception as e:
+            print(f"Error auditing pre-router decision: {e}")
+            return
+        self.pre_router.record_audit(routed_name, recorder.target or self.main_assistant.name)
+
+    async def process_input(self, input_text: str, route_text: str = None) -> RunResult:
         """
         Routes the input to the appropriate agent and returns the result.
         Format input as expected by the Runner: [{"content": msg, "role": "user"}]
+        route_text is the user's own message, obvious ones go straight to a specialist without the routing round-trip.
         """
-        print(f"Using agent: {self.main_assistant.name}")  # Log the agent name
+        starting_agent = self.select_agent(input_text, route_text)
+        print(f"Using agent: {starting_agent.name}")  # Log the agent name
 
         print("Processing input...")
         print(f"Input text: {input_text}")
@@ -41,11 +130,50 @@ class Supervisor:
         # Format input as a list of input items with content and role
         formatted_input = [{"content": input_text, "role": "user"}]
         
-        result = await Runner.run(self.main_assistant, input=formatted_input)
+        async with llm_semaphore:
+            result = await Runner.run(starting_agent, input=formatted_input)
 
-        result = self.html_transformer.transform_to_html(result.final_output)
+        async with llm_semaphore:
+            result = await self.html_transformer.atransform_to_html(result.final_output)
 
         # return result.final_output
 
         return result
 
+    async def process_input_streamed(self, input_text: str, route_text: str = None):
+        """
+        Streaming variant of process_input.
+
+        Yields:
+        - ("agent", {"agent": name}) whenever the run hands off to another agent
+        - ("delta", {"text": text}) for every partial chunk of model output
+        - ("html_chunk", {"html": html}) for every renderable piece of the HTML as it is generated
+        - ("html", HtmlOutput) once the final output has been rendered
+        """
+        starting_agent = self.select_agent(input_text, route_text)
+        print(f"Using agent: {starting_agent.name}")  # Log the agent name
+        print(f"Streaming input text: {input_text}")
+
+        formatted_input = [{"content": input_text, "role": "user"}]
+        runs = []
+
+        async def agent_events():
+            result = Runner.run_streamed(starting_agent, input=formatted_input)
+            runs.append(result)
+            async for event in result.stream_events():
+                if isinstance(event, AgentUpdatedStreamEvent):
+                    yield "agent", {"agent": event.new_agent.name}
+                elif isinstance(event, RawResponsesStreamEvent) and isinstance(event.data, ResponseTextDeltaEvent):
+                    yield "delta", {"text": event.data.delta}
+
+        async for event in stream_with_llm_permit(agent_events):
+            yield event
+
+        def html_stream():
+            return self.html_transformer.transform_to_html_stream(runs[0].final_output)
+
+        async for html_output in stream_with_llm_permit(html_stream):
+            if html_output.status == "partial":
+                yield "html_chunk", {"html": html_output.data}
+
+        yield "html", html_output
@@ -1,39 +1,58 @@
+import os
+import re
+
 from our_agents_definition.base_agent import BaseAgentOutput
+from html_templates import render_template
 
 import groq
 
 
+class HtmlOutput(BaseAgentOutput):
+    """
+    Output model for the HTMLTransformer.
+    """
+
+
+# Groq model used to generate the HTML
+HTML_MODEL_NAME = "llama-3.3-70b-versatile"
+
+# Closing tags after which a partial document can be flushed to the frontend
+SAFE_BOUNDARY_PATTERN = re.compile(
+    r"</(?:div|section|article|header|footer|main|nav|aside|p|ul|ol|li|table|thead|tbody|tr|h[1-6]|form|figure|blockquote|pre)\s*>",
+    re.IGNORECASE,
+)
+
+# Render structured agent outputs with local templates instead of the LLM
+HTML_TEMPLATES_ENABLED = os.getenv("HTML_TEMPLATES_ENABLED", "true").lower() == "true"
+
+# Longest closing tag we look for, so a tag split across deltas is still found
+_MAX_TAG_LENGTH = 16
+
+
 class HTMLTransformer:
-    
-    def __init__(self, llm_client, llm_model_name):
+
+    def __init__(self, llm_client, llm_model_name, async_llm_client=None, render_cache=None):
         """
         Initialize the HTMLTransformer with an LLM client.
 
         Parameters:
         - llm_client: The LLM client to use for generating HTML
+        - llm_model_name: The name of the LLM deployment
+        - async_llm_client: Optional async LLM client used by the async and streaming transforms
+        - render_cache: Optional RenderCache, a hit skips the LLM call entirely
         """
         self.llm_client = llm_client
         self.llm_model_name = llm_model_name
+        self.async_llm_client = async_llm_client
+        self.render_cache = render_cache
+        self.template_renders = 0
+        self.llm_renders = 0
 
-    def transform_to_html(self, data: dict) -> str:
+    def build_prompt(self, data) -> str:
         """
-        Use the LLM client to transform the given data into a well-structured HTML.
-
-        Parameters:
-        - data: The data to transform
-
-        Returns:
-        - HTML string generated by the LLM
+        Build the HTML generation prompt for the given agent output.
         """
-
-        class HtmlOutput(BaseAgentOutput):
-            """
-            Output model for the Health Agent.
-            """
-
-        print("Transforming data into HTML...")
-
-        prompt = (
+        return (
             "Transform the following input data into a well-structured HTML using Tailwind CSS. "
             "Ensure the HTML is visually appealing and includes modern, responsive UI components such as cards, tables, lists"
             "Use Tailwind CSS classes to style the components for a clean and professional design. "
@@ -47,8 +66,108 @@ class HTMLTransformer:
             f"Input Data: {data.data}"
         )
 
+    def render_locally(self, data):
+        """
+        Render structured outputs with a local template, skipping the LLM.
+
+        Returns:
+        - HtmlOutput, or None if the output is free-form and needs the LLM
+        """
+        if not HTML_TEMPLATES_ENABLED:
+            return None
+        html = render_template(data)
+        if html is None:
+            return None
+        self.template_renders += 1
+        return HtmlOutput(agent_type="html", status="success", data=html)
+
+    def stats(self) -> dict:
+        """
+        Return how outputs were rendered, for monitoring.
+        """
+        return {
+            "template_renders": self.template_renders,
+            "llm_renders": self.llm_renders,
+            "render_cache": self.render_cache.stats() if self.render_cache is not None else None,
+        }
+
+    def get_cached(self, prompt: str):
+        """
+        Look up a previously rendered document for the prompt.
+
+        Returns:
+        - The cache key (None when caching is disabled) and the cached HtmlOutput or None
+        """
+        if self.render_cache is None:
+            return None, None
+        key = self.render_cache.make_key(HTML_MODEL_NAME, prompt)
+        html = self.render_cache.get(key)
+        if html is None:
+            return key, None
+        print("HTML render cache hit.")
+        return key, HtmlOutput(agent_type="html", status="success", data=html)
+
+    async def aget_cached(self, prompt: str):
+        """
+        Async variant of get_cached, the disk tier of the cache is read off the event loop.
+        """
+        if self.render_cache is None:
+            return None, None
+        key = self.render_cache.make_key(HTML_MODEL_NAME, prompt)
+        html = await self.render_cache.aget(key)
+        if html is None:
+            return key, None
+        print("HTML render cache hit.")
+        return key, HtmlOutput(agent_type="html", status="success", data=html)
+
+    def store_cached(self, key, output: HtmlOutput):
+        # Only successful renders are worth serving again
+        if key is not None and output.status == "success":
+            self.render_cache.set(key, output.data)
+
+    async def astore_cached(self, key, output: HtmlOutput):
+        if key is not None and output.status == "success":
+            await self.render_cache.aset(key, output.data)
+
+    def to_output(self, response) -> HtmlOutput:
+        """
+        Wrap the raw LLM response into an HtmlOutput.
+        """
+        if not response:
+            return HtmlOutput(agent_type="html", status="error", data="Error data is None")
+
+        if response.strip().startswith("<!DOCTYPE html>") or response.strip().startswith("<html"):
+            # print(f"Generated HTML: {response}")
+            return HtmlOutput(agent_type="html", status="success", data=response)
+
+        else:
+            return HtmlOutput(agent_type="html", status="success", data=response)
+
+    def transform_to_html(self, data: dict) -> HtmlOutput:
+        """
+        Use the LLM client to transform the given data into a well-structured HTML.
+
+        Parameters:
+        - data: The data to transform
+
+        Returns:
+        - HTML string generated by the LLM
+        """
+
+        local_output = self.render_locally(data)
+        if local_output is not None:
+            return local_output
+
+        print("Transforming data into HTML...")
+
+        prompt = self.build_prompt(data)
+        cache_key, cached = self.get_cached(prompt)
+        if cached is not None:
+            return cached
+        self.llm_renders += 1
+
         # print(prompt)
-        
+
         # # for attempt in range(3):  # Retry up to 3 times
         # response = self.llm_client.beta.chat.completions.parse(
         #     model=self.llm_model_name,
@@ -63,22 +182,113 @@ class HTMLTransformer:
                 "content": prompt
             }
             ],
-            model="llama-3.3-70b-versatile",
+            model=HTML_MODEL_NAME,
         )
         # print(chat_completion.choices[0].message.content)
         response = chat_completion.choices[0].message.content
-            
 
-        if response is None:
-            return "Error data is None"
-
-        if response.strip().startswith("<!DOCTYPE html>") or response.strip().startswith("<html"):
-            # print(f"Generated HTML: {response}")
-            return HtmlOutput(agent_type="html", status="success", data=response)
-        
-        else:
-            return HtmlOutput(agent_type="html", status="success", data=response)
+        output = self.to_output(response)
+        self.store_cached(cache_key, output)
+        return output
 
             # print(f"Attempt {attempt + 1}: Invalid HTML response, retrying...")
 
-        # raise ValueError("Failed to generate valid HTML after 3 attempts.")
\ No newline at end of file
+        # raise ValueError("Failed to generate valid HTML after 3 attempts.")
+
+    async def atransform_to_html(self, data: dict) -> HtmlOutput:
+        """
+        Async variant of transform_to_html that does not block the event loop.
+
+        Parameters:
+        - data: The data to transform
+
+        Returns:
+        - HtmlOutput with the generated HTML
+        """
+        if self.async_llm_client is None:
+            raise RuntimeError("HTMLTransformer was created without an async LLM client")
+
+        local_output = self.render_locally(data)
+        if local_output is not None:
+            return local_output
+
+        prompt = self.build_prompt(data)
+        cache_key, cached = await self.aget_cached(prompt)
+        if cached is not None:
+            return cached
+        self.llm_renders += 1
+
+        print("Transforming data into HTML (async)...")
+
+        chat_completion = await self.async_llm_client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=HTML_MODEL_NAME,
+        )
+        output = self.to_output(chat_completion.choices[0].message.content)
+        await self.astore_cached(cache_key, output)
+        return output
+
+    async def transform_to_html_stream(self, data: dict):
+        """
+        Stream the HTML as it is generated.
+
+        Chunks are only cut right after a closing block tag (</div>, </section>, </li>, ...),
+        so each one can be appended to the page and rendered as it arrives.
+
+        Parameters:
+        - data: The data to transform
+
+        Yields:
+        - HtmlOutput with status "partial" for every chunk, then one final HtmlOutput
+          with the whole document and the same semantics as transform_to_html
+        """
+        if self.async_llm_client is None:
+            raise RuntimeError("HTMLTransformer was created without an async LLM client")
+
+        prompt = self.build_prompt(data)
+        local_output = self.render_locally(data)
+        if local_output is None:
+            cache_key, local_output = await self.aget_cached(prompt)
+        if local_output is not None:
+            # Already rendered, send the whole document as a single chunk
+            yield HtmlOutput(agent_type="html", status="partial", data=local_output.data)
+            yield local_output
+            return
+        self.llm_renders += 1
+
+        print("Streaming data into HTML...")
+
+        stream = await self.async_llm_client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=HTML_MODEL_NAME,
+            stream=True,
+        )
+
+        document = []
+        pending = ""
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+
+            # Only rescan the tail that could hold a tag completed by this delta
+            scan_from = max(0, len(pending) - _MAX_TAG_LENGTH)
+            pending += delta
+
+            boundary = None
+            for boundary in SAFE_BOUNDARY_PATTERN.finditer(pending, scan_from):
+                pass
+            if boundary is not None:
+                ready, pending = pending[:boundary.end()], pending[boundary.end():]
+                document.append(ready)
+                yield HtmlOutput(agent_type="html", status="partial", data=ready)
+
+        if pending:
+            document.append(pending)
+            yield HtmlOutput(agent_type="html", status="partial", data=pending)
+
+        output = self.to_output("".join(document))
+        await self.astore_cached(cache_key, output)
+        yield output
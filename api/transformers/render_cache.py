@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+from utils.ttl_cache import TTLCache
+
+# Number of rendered documents kept in memory
+HTML_CACHE_SIZE = int(os.getenv("HTML_CACHE_SIZE", "512"))
+
+# Seconds a rendered document stays valid
+HTML_CACHE_TTL = float(os.getenv("HTML_CACHE_TTL", "3600"))
+
+# Directory for the on-disk tier, leave empty to keep the cache in memory only
+HTML_CACHE_DIR = os.getenv("HTML_CACHE_DIR", "")
+
+# Largest size of the on-disk tier in MB, the oldest entries are deleted past it
+HTML_CACHE_DIR_MAX_MB = float(os.getenv("HTML_CACHE_DIR_MAX_MB", "256"))
+
+# Seconds between sweeps that delete expired entries from the on-disk tier
+HTML_CACHE_SWEEP_INTERVAL = float(os.getenv("HTML_CACHE_SWEEP_INTERVAL", "600"))
+
+# Share of the size cap a sweep trims the on-disk tier down to, so one sweep makes room for many writes
+DISK_SWEEP_TARGET = 0.9
+
+
+class RenderCache:
+    """
+    Content-addressed cache for rendered HTML.
+
+    Entries are keyed on the hash of the full transformer prompt (which embeds the input data)
+    and the model name, so changing either one never serves a stale document. Lookups go to an
+    in-memory LRU first and then, if configured, to a directory of JSON files that survives restarts.
+    The directory is kept under HTML_CACHE_DIR_MAX_MB by sweeps that delete expired entries and
+    then the oldest ones. The async methods do their file I/O in a worker thread.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = HTML_CACHE_SIZE,
+        ttl_seconds: float = HTML_CACHE_TTL,
+        disk_dir: str = HTML_CACHE_DIR,
+        disk_max_mb: float = HTML_CACHE_DIR_MAX_MB,
+        sweep_interval: float = HTML_CACHE_SWEEP_INTERVAL,
+    ):
+        self.memory = TTLCache(max_entries, ttl_seconds)
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = int(disk_max_mb * 1024 * 1024)
+        self.sweep_interval = sweep_interval
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_bytes = 0  # Size of the on-disk tier, recounted by every sweep
+        self.disk_evictions = 0
+        self.expired_deleted = 0
+        self._disk_lock = threading.Lock()
+        self._last_sweep = 0.0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            # Counts what earlier runs left and trims it to the current limits
+            self._sweep()
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str) -> str:
+        """
+        Build the cache key for a prompt rendered by the given model.
+        """
+        return hashlib.sha256(f"{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str):
+        """
+        Return the cached HTML for the key, or None on a miss.
+        """
+        html = self.memory.get(key)
+        if html is None and self.disk_dir:
+            html = self._promote(key, self._read_disk(key))
+        if html is None:
+            self.misses += 1
+        return html
+
+    async def aget(self, key: str):
+        """
+        Async variant of get, the disk tier is read off the event loop.
+        """
+        html = self.memory.get(key)
+        if html is None and self.disk_dir:
+            html = self._promote(key, await asyncio.to_thread(self._read_disk, key))
+        if html is None:
+            self.misses += 1
+        return html
+
+    def set(self, key: str, html: str):
+        """
+        Store rendered HTML in memory and, if configured, on disk.
+        """
+        self.memory.set(key, html)
+        if self.disk_dir:
+            self._write_disk(key, html)
+
+    async def aset(self, key: str, html: str):
+        """
+        Async variant of set, the disk tier is written off the event loop.
+        """
+        self.memory.set(key, html)
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, key, html)
+
+    def _promote(self, key: str, entry):
+        if entry is None:
+            return None
+        html, age = entry
+        self.disk_hits += 1
+        # Promote to memory for the rest of its lifetime
+        self.memory.set(key, html, self.ttl_seconds - age)
+        return html
+
+    def _read_disk(self, key: str):
+        """
+        Return (html, age in seconds) for a valid disk entry, or None. Deletes the entry if it expired.
+        """
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+            age = time.time() - entry["created_at"]
+            if age < self.ttl_seconds:
+                return entry["html"], age
+            self._delete(path)
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def _write_disk(self, key: str, html: str):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so readers never see a partial entry
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump({"created_at": time.time(), "html": html}, file, ensure_ascii=False)
+            size = os.path.getsize(temp_path)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error writing HTML cache entry to disk: {e}")
+            return
+        with self._disk_lock:
+            self.disk_bytes += size - replaced
+            due = self.disk_bytes > self.disk_max_bytes or time.time() - self._last_sweep >= self.sweep_interval
+        if due:
+            self._sweep()
+
+    def _delete(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.unlink(path)
+        except OSError:
+            return
+        with self._disk_lock:
+            self.disk_bytes -= size
+            self.expired_deleted += 1
+
+    def _sweep(self):
+        """
+        Delete expired entries, then the oldest ones until the disk tier is back under its target size.
+        """
+        with self._disk_lock:
+            self._last_sweep = time.time()
+            expired_before = self._last_sweep - self.ttl_seconds
+            entries = []  # (modified at, size, path) of the entries kept
+            expired = evicted = 0
+            total = 0
+            for directory in os.scandir(self.disk_dir):
+                if not directory.is_dir():
+                    continue
+                for file in os.scandir(directory.path):
+                    try:
+                        info = file.stat()
+                        if file.name.endswith(".json") and info.st_mtime >= expired_before:
+                            entries.append((info.st_mtime, info.st_size, file.path))
+                            total += info.st_size
+                            continue
+                        # Expired entries, and temporary files left by a crash mid-write
+                        if not file.name.endswith(".tmp") or info.st_mtime < expired_before:
+                            os.unlink(file.path)
+                            expired += 1
+                    except OSError:
+                        pass
+            if total > self.disk_max_bytes:
+                entries.sort()
+                target = self.disk_max_bytes * DISK_SWEEP_TARGET
+                for _, size, path in entries:
+                    if total <= target:
+                        break
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        continue
+                    total -= size
+                    evicted += 1
+            self.disk_bytes = total
+            self.expired_deleted += expired
+            self.disk_evictions += evicted
+        if expired or evicted:
+            print(f"HTML cache sweep deleted {expired} expired and {evicted} old disk entries, {total / (1024 * 1024):.1f} MB left")
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters for both tiers.
+        """
+        memory_stats = self.memory.stats()
+        hits = memory_stats["hits"] + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "entries": memory_stats["entries"],
+            "memory_hits": memory_stats["hits"],
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": memory_stats["evictions"],
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "disk_enabled": self.disk_dir is not None,
+            "disk_bytes": self.disk_bytes,
+            "disk_max_bytes": self.disk_max_bytes,
+            "disk_evictions": self.disk_evictions,
+            "disk_expired_deleted": self.expired_deleted,
+        }
@@ -0,0 +1,190 @@
+"""
+Split long recordings at silences so their pieces can be transcribed in parallel.
+
+Silences are found with ffmpeg's silencedetect filter. Cuts are placed in the middle of the
+silence closest to every SEGMENT_TARGET_SECONDS mark, and each segment is extended by
+SEGMENT_OVERLAP_SECONDS on both sides so no word is lost at a cut. The words transcribed twice in
+the overlaps are removed again by stitch_transcripts.
+
+Without ffmpeg on the PATH nothing is split and callers transcribe the clip in one pass.
+"""
+import asyncio
+import os
+import re
+import shutil
+import tempfile
+import unicodedata
+
+from utils.transcription_pool import WHISPER_WORKERS
+
+# Set to false to always transcribe recordings in one pass
+AUDIO_SEGMENTATION_ENABLED = os.getenv("AUDIO_SEGMENTATION_ENABLED", "true").lower() == "true"
+
+# Recordings shorter than this (seconds) are transcribed in one pass
+SEGMENT_MIN_DURATION = float(os.getenv("SEGMENT_MIN_DURATION", "45"))
+
+# Preferred segment length in seconds, the actual cut snaps to the nearest silence
+SEGMENT_TARGET_SECONDS = float(os.getenv("SEGMENT_TARGET_SECONDS", "30"))
+
+# Audio shared by neighbouring segments on each side of a cut, in seconds
+SEGMENT_OVERLAP_SECONDS = float(os.getenv("SEGMENT_OVERLAP_SECONDS", "1.0"))
+
+# Segments of one recording transcribed at the same time
+SEGMENT_PARALLELISM = int(os.getenv("SEGMENT_PARALLELISM", "4"))
+
+# ffmpeg and ffprobe processes running at once across all uploads. Sized like the transcription
+# pool by default: more segments ready than workers to transcribe them only costs CPU and disk.
+FFMPEG_MAX_PROCESSES = int(os.getenv("FFMPEG_MAX_PROCESSES", str(WHISPER_WORKERS)))
+
+# silencedetect settings: anything quieter than the threshold for at least the duration is a silence
+SILENCE_THRESHOLD_DB = -35
+SILENCE_MIN_SECONDS = 0.4
+
+# A cut may move this share of the target length away from its mark to reach a silence
+CUT_SEARCH_WINDOW = 0.35
+
+# Longest run of words compared when removing the text repeated in an overlap
+MAX_OVERLAP_WORDS = 12
+
+SILENCE_START_PATTERN = re.compile(r"silence_start: (-?\d+(?:\.\d+)?)")
+SILENCE_END_PATTERN = re.compile(r"silence_end: (-?\d+(?:\.\d+)?)")
+
+# Held around every ffmpeg/ffprobe subprocess, so a recording with many pauses cannot start one per segment at once
+ffmpeg_semaphore = asyncio.Semaphore(max(1, FFMPEG_MAX_PROCESSES))
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+async def _run(*command) -> tuple:
+    async with ffmpeg_semaphore:
+        process = await asyncio.create_subprocess_exec(
+            *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"{command[0]} failed: {stderr.decode(errors='ignore')[-300:]}")
+    return stdout.decode(errors="ignore"), stderr.decode(errors="ignore")
+
+
+async def probe_duration(audio_path: str) -> float:
+    stdout, _ = await _run(
+        "ffprobe", "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1", audio_path,
+    )
+    return float(stdout.strip())
+
+
+async def detect_silences(audio_path: str) -> list:
+    """
+    Return the (start, end) of every silence in the recording, in seconds.
+    """
+    _, stderr = await _run(
+        "ffmpeg", "-hide_banner", "-nostats", "-i", audio_path,
+        "-af", f"silencedetect=noise={SILENCE_THRESHOLD_DB}dB:d={SILENCE_MIN_SECONDS}",
+        "-f", "null", "-",
+    )
+    starts = [float(value) for value in SILENCE_START_PATTERN.findall(stderr)]
+    ends = [float(value) for value in SILENCE_END_PATTERN.findall(stderr)]
+    return list(zip(starts, ends))
+
+
+def plan_segments(duration: float, silences: list, target: float = SEGMENT_TARGET_SECONDS, overlap: float = SEGMENT_OVERLAP_SECONDS) -> list:
+    """
+    Choose the segments to transcribe.
+
+    Parameters:
+    - duration: Length of the recording in seconds
+    - silences: (start, end) of the silences in the recording
+    - target: Preferred segment length
+    - overlap: Seconds added on both sides of every cut
+
+    Returns:
+    - (start, end) of every segment in order, overlapping their neighbours
+    """
+    midpoints = [(start + end) / 2 for start, end in silences if 0 < (start + end) / 2 < duration]
+    cuts = []
+    position = 0.0
+    while duration - position > target * (1 + CUT_SEARCH_WINDOW):
+        mark = position + target
+        window = target * CUT_SEARCH_WINDOW
+        candidates = [point for point in midpoints if abs(point - mark) <= window and point > position + overlap * 2]
+        # Cut in the silence closest to the mark, or right at the mark if the speaker never pauses
+        cut = min(candidates, key=lambda point: abs(point - mark)) if candidates else mark
+        cuts.append(cut)
+        position = cut
+
+    bounds = [0.0] + cuts + [duration]
+    return [
+        (max(0.0, bounds[index] - overlap if index > 0 else 0.0), min(duration, bounds[index + 1] + overlap))
+        for index in range(len(bounds) - 1)
+    ]
+
+
+async def extract_segment(audio_path: str, start: float, end: float, output_dir: str, index: int) -> str:
+    """
+    Write one segment as 16 kHz mono WAV, the format Whisper resamples to anyway.
+    """
+    output_path = os.path.join(output_dir, f"segment_{index:03d}.wav")
+    await _run(
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", audio_path,
+        "-ac", "1", "-ar", "16000", output_path,
+    )
+    return output_path
+
+
+async def split_audio(audio_path: str):
+    """
+    Split a long recording at silences.
+
+    Returns:
+    - (temporary directory, segment paths in order), or None if the recording should be
+      transcribed in one pass. The caller removes the directory when done.
+    """
+    if not AUDIO_SEGMENTATION_ENABLED or not ffmpeg_available():
+        return None
+    duration = await probe_duration(audio_path)
+    if duration < SEGMENT_MIN_DURATION:
+        return None
+
+    segments = plan_segments(duration, await detect_silences(audio_path))
+    if len(segments) < 2:
+        return None
+
+    output_dir = tempfile.mkdtemp(prefix="segments_")
+    try:
+        paths = await asyncio.gather(
+            *[extract_segment(audio_path, start, end, output_dir, index) for index, (start, end) in enumerate(segments)]
+        )
+    except BaseException:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+    print(f"Split {duration:.0f}s of audio into {len(paths)} segments")
+    return output_dir, list(paths)
+
+
+def _normalize_word(word: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", word.casefold())
+    return "".join(char for char in decomposed if char.isalnum())
+
+
+def stitch_transcripts(texts: list) -> str:
+    """
+    Join segment transcripts in order, dropping the words repeated across each overlap.
+    """
+    words = []
+    for text in texts:
+        next_words = (text or "").split()
+        if not next_words:
+            continue
+        tail = [_normalize_word(word) for word in words[-MAX_OVERLAP_WORDS:]]
+        head = [_normalize_word(word) for word in next_words[:MAX_OVERLAP_WORDS]]
+        repeated = 0
+        for size in range(min(len(tail), len(head)), 0, -1):
+            if tail[-size:] == head[:size]:
+                repeated = size
+                break
+        words.extend(next_words[repeated:])
+    return " ".join(words)
@@ -0,0 +1,142 @@
+import os
+import tempfile
+
+from fastapi import Request
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+
+# Largest audio upload accepted, in bytes (Groq's transcription API accepts up to 25 MB)
+AUDIO_MAX_UPLOAD_BYTES = int(os.getenv("AUDIO_MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+
+# Room for the multipart boundaries and form fields around the audio when checking Content-Length
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Largest value accepted for a plain (non-file) form field such as user_id
+MAX_FIELD_BYTES = 4 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """
+    Raised when an upload is bigger than AUDIO_MAX_UPLOAD_BYTES.
+    """
+
+
+class InvalidUploadError(Exception):
+    """
+    Raised when an upload is not a multipart form with an audio file.
+    """
+
+
+def check_content_length(content_length, max_bytes: int = AUDIO_MAX_UPLOAD_BYTES):
+    """
+    Reject a request by its Content-Length header before its body is read.
+    """
+    try:
+        declared = int(content_length)
+    except (TypeError, ValueError):
+        return  # Unknown length (chunked upload), the limit is enforced while reading the body
+    if declared > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise UploadTooLargeError(f"Audio upload larger than {max_bytes} bytes")
+
+
+async def receive_audio_form(request: Request, file_field: str = "file", max_bytes: int = AUDIO_MAX_UPLOAD_BYTES) -> tuple:
+    """
+    Read a multipart/form-data request straight from the socket, writing the audio file part to a
+    single temporary file as it arrives.
+
+    The body is never buffered or spooled anywhere else, and reading stops as soon as the audio
+    passes the limit, also for chunked uploads that send no Content-Length.
+
+    Parameters:
+    - request: The incoming request, its body must not have been read yet
+    - file_field: Name of the form field holding the audio
+    - max_bytes: Largest audio file accepted
+
+    Returns:
+    - (path of the temporary audio file, dict of the other form fields). The caller deletes the file.
+
+    Raises:
+    - UploadTooLargeError if the audio is bigger than max_bytes
+    - InvalidUploadError if the body is not multipart or has no audio file
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise InvalidUploadError("Expected a multipart/form-data upload")
+
+    fields = {}
+    # Part being parsed: its headers (field/value hold the header being read), name, body and file
+    state = {"headers": {}, "field": b"", "value": b"", "name": None, "data": b"", "file": None, "written": 0}
+    audio = {"path": None}
+
+    def on_part_begin():
+        state.update(headers={}, name=None, file=None, data=b"")
+
+    def on_header_field(data: bytes, start: int, end: int):
+        state["field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["field"].lower()] = state["value"]
+        state.update(field=b"", value=b"")
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        name = disposition.get(b"name", b"").decode("latin-1")
+        filename = disposition.get(b"filename")
+        state["name"] = name
+        if name == file_field and filename is not None and audio["path"] is None:
+            suffix = os.path.splitext(filename.decode("latin-1"))[1] or ".wav"
+            state["file"] = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+            audio["path"] = state["file"].name
+
+    def on_part_data(data: bytes, start: int, end: int):
+        chunk = data[start:end]
+        if state["file"] is not None:
+            state["written"] += len(chunk)
+            if state["written"] > max_bytes:
+                raise UploadTooLargeError(f"Audio upload larger than {max_bytes} bytes")
+            state["file"].write(chunk)
+        else:
+            state["data"] += chunk
+            if len(state["data"]) > MAX_FIELD_BYTES:
+                raise InvalidUploadError(f"Form field '{state['name']}' is too long")
+
+    def on_part_end():
+        if state["file"] is not None:
+            state["file"].close()
+        elif state["name"]:
+            fields[state["name"]] = state["data"].decode("utf-8", errors="replace")
+        state.update(data=b"", file=None)
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+        if audio["path"] is None:
+            raise InvalidUploadError(f"Missing audio file in form field '{file_field}'")
+    except MultipartParseError as e:
+        _discard(state, audio)
+        raise InvalidUploadError(f"Malformed multipart upload: {e}")
+    except BaseException:
+        _discard(state, audio)
+        raise
+    return audio["path"], fields
+
+
+def _discard(state: dict, audio: dict):
+    if state["file"] is not None:
+        state["file"].close()
+    if audio["path"] is not None:
+        os.unlink(audio["path"])
@@ -0,0 +1,29 @@
+import asyncio
+import os
+
+# Maximum number of upstream LLM requests a single worker keeps in flight at once
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+
+# Maximum number of blocking calls (sync SDKs, file I/O) offloaded to threads at once
+BLOCKING_MAX_CONCURRENCY = int(os.getenv("BLOCKING_MAX_CONCURRENCY", "8"))
+
+# Acquire this around every awaited upstream LLM call on the request path.
+# Never acquire it while already holding it, so parallel callers cannot deadlock.
+llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+_blocking_semaphore = asyncio.Semaphore(BLOCKING_MAX_CONCURRENCY)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run a blocking function in a worker thread without freezing the event loop.
+
+    Parameters:
+    - func: The blocking callable
+    - args, kwargs: Arguments forwarded to the callable
+
+    Returns:
+    - Whatever the callable returns
+    """
+    async with _blocking_semaphore:
+        return await asyncio.to_thread(func, *args, **kwargs)
@@ -0,0 +1,149 @@
+import asyncio
+import bisect
+import os
+import random
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+# Seconds allowed to open a connection
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+
+# Seconds allowed for a whole request attempt (connect, send and read)
+HTTP_TOTAL_TIMEOUT = float(os.getenv("HTTP_TOTAL_TIMEOUT", "10"))
+
+# Extra attempts for idempotent GET requests that fail with a transient error
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+
+# Base delay in seconds for the jittered exponential backoff between retries
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.25"))
+
+# Maximum concurrent requests (and pooled connections) per upstream host
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "8"))
+
+# Status codes worth retrying for GET requests
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+# Upper bounds in milliseconds of the latency histogram buckets
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+_client = None
+_host_semaphores = {}  # host -> semaphore capping concurrent requests to it
+_latency = {}  # tool name -> LatencyHistogram
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram for one tool.
+    """
+
+    __slots__ = ("counts", "total", "sum_ms", "errors")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)  # Last bucket catches everything slower
+        self.total = 0
+        self.sum_ms = 0.0
+        self.errors = 0
+
+    def observe(self, elapsed_ms: float, error: bool = False):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.total += 1
+        self.sum_ms += elapsed_ms
+        if error:
+            self.errors += 1
+
+    def to_dict(self) -> dict:
+        labels = [f"le_{bound}ms" for bound in LATENCY_BUCKETS_MS] + ["le_inf"]
+        return {
+            "count": self.total,
+            "errors": self.errors,
+            "avg_ms": round(self.sum_ms / self.total, 1) if self.total else 0.0,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+def init_http_client() -> httpx.AsyncClient:
+    """
+    Create the shared HTTP client for agent tools. Called at startup, and lazily on first use otherwise.
+    """
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_TOTAL_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            # httpx pools connections per host, the per-host semaphores keep each pool within HTTP_MAX_PER_HOST
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=HTTP_MAX_PER_HOST * 4, keepalive_expiry=60),
+        )
+    return _client
+
+
+async def close_http_client():
+    """
+    Close the shared HTTP client and its connection pools.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    semaphore = _host_semaphores.get(host)
+    if semaphore is None:
+        semaphore = _host_semaphores[host] = asyncio.Semaphore(HTTP_MAX_PER_HOST)
+    return semaphore
+
+
+async def request(method: str, url: str, tool: str, **kwargs) -> httpx.Response:
+    """
+    Send a request through the shared client.
+
+    Every attempt is bounded by HTTP_TOTAL_TIMEOUT. GET requests are retried with jittered
+    exponential backoff on connection errors, timeouts and 429/5xx gateway errors.
+    Other methods are never retried because they may not be idempotent.
+
+    Parameters:
+    - method: HTTP method
+    - url: Full request URL
+    - tool: Name of the calling tool, used for the latency histograms
+    - kwargs: Forwarded to httpx (params, json, headers, ...)
+
+    Returns:
+    - The httpx response
+    """
+    client = init_http_client()
+    attempts = 1 + (HTTP_MAX_RETRIES if method.upper() == "GET" else 0)
+    histogram = _latency.setdefault(tool, LatencyHistogram())
+    started = time.perf_counter()
+
+    for attempt in range(attempts):
+        is_last = attempt == attempts - 1
+        try:
+            async with _host_semaphore(url):
+                response = await asyncio.wait_for(client.request(method, url, **kwargs), HTTP_TOTAL_TIMEOUT)
+            if response.status_code not in RETRY_STATUS_CODES or is_last:
+                histogram.observe((time.perf_counter() - started) * 1000, error=response.status_code >= 400)
+                return response
+        except (httpx.TransportError, asyncio.TimeoutError):
+            if is_last:
+                histogram.observe((time.perf_counter() - started) * 1000, error=True)
+                raise
+
+        # Full jitter keeps retries from many workers from arriving in lockstep
+        await asyncio.sleep(random.uniform(0, HTTP_RETRY_BACKOFF * (2 ** attempt)))
+
+
+async def http_get(url: str, tool: str, **kwargs) -> httpx.Response:
+    return await request("GET", url, tool, **kwargs)
+
+
+async def http_post(url: str, tool: str, **kwargs) -> httpx.Response:
+    return await request("POST", url, tool, **kwargs)
+
+
+def get_http_stats() -> dict:
+    """
+    Return per-tool latency histograms for monitoring.
+    """
+    return {tool: histogram.to_dict() for tool, histogram in _latency.items()}
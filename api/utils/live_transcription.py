@@ -0,0 +1,161 @@
+"""
+Incremental transcription of microphone audio received while the user is still speaking.
+
+The client streams raw 16-bit little-endian mono PCM. Audio is cut into utterances at pauses
+(the loudness of 20 ms windows stays under LIVE_SILENCE_RMS for LIVE_SILENCE_MS), and every
+utterance is transcribed in the background as soon as it is cut. When the user stops, only the
+last utterance is still left to transcribe.
+"""
+import array
+import asyncio
+import math
+import os
+import sys
+import tempfile
+import wave
+
+# Loudness (RMS of 16-bit samples) under which a window counts as silence
+LIVE_SILENCE_RMS = float(os.getenv("LIVE_SILENCE_RMS", "500"))
+
+# Pause length in milliseconds that ends an utterance
+LIVE_SILENCE_MS = int(os.getenv("LIVE_SILENCE_MS", "600"))
+
+# Utterances longer than this (seconds) are cut even if the speaker never pauses
+LIVE_MAX_SEGMENT_SECONDS = float(os.getenv("LIVE_MAX_SEGMENT_SECONDS", "20"))
+
+# Utterances transcribed at the same time for one connection
+LIVE_PARALLELISM = int(os.getenv("LIVE_PARALLELISM", "2"))
+
+# Sample rates accepted from clients, microphones record between telephone and studio quality
+LIVE_MIN_SAMPLE_RATE = 8000
+LIVE_MAX_SAMPLE_RATE = 48000
+
+WINDOW_MS = 20
+MIN_SEGMENT_SECONDS = 1.0
+
+# Silence kept in front of an utterance so its first syllable is not clipped
+LEADING_SILENCE_MS = 300
+
+
+def window_rms(pcm: bytes) -> float:
+    samples = array.array("h", pcm)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(sample * sample for sample in samples) / len(samples))
+
+
+def write_wav(pcm: bytes, sample_rate: int) -> str:
+    """
+    Write PCM audio to a temporary WAV file and return its path.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
+        with wave.open(temp_audio, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            wav.writeframes(pcm)
+        return temp_audio.name
+
+
+class LiveTranscriber:
+    """
+    Collects PCM frames from one connection and transcribes them utterance by utterance.
+    """
+
+    def __init__(self, transcribe, sample_rate: int = 16000, on_partial=None, max_bytes: int = None):
+        """
+        Parameters:
+        - transcribe: Async callable taking a WAV file path and returning its text
+        - sample_rate: Sample rate of the incoming PCM
+        - on_partial: Optional async callable(index, text) awaited as each utterance is transcribed
+        - max_bytes: Optional limit on the total audio received
+        """
+        self.transcribe = transcribe
+        self.sample_rate = sample_rate
+        self.on_partial = on_partial
+        self.max_bytes = max_bytes
+        self.window_bytes = sample_rate * WINDOW_MS // 1000 * 2
+        # A zero-byte window would make feed() loop forever
+        assert self.window_bytes > 0, f"Sample rate {sample_rate} is too low"
+        self.received_bytes = 0
+        self._pending = bytearray()  # Bytes not yet forming a whole window
+        self._segment = bytearray()
+        self._speech_seen = False
+        self._silent_ms = 0
+        self._semaphore = asyncio.Semaphore(LIVE_PARALLELISM)
+        self._tasks = []
+
+    def _seconds(self, pcm) -> float:
+        return len(pcm) / (self.sample_rate * 2)
+
+    def feed(self, pcm: bytes):
+        """
+        Add audio. Utterances that end in this audio start transcribing right away.
+
+        Raises:
+        - ValueError if more than max_bytes of audio were received
+        """
+        self.received_bytes += len(pcm)
+        if self.max_bytes is not None and self.received_bytes > self.max_bytes:
+            raise ValueError(f"Audio stream larger than {self.max_bytes} bytes")
+
+        self._pending.extend(pcm)
+        while len(self._pending) >= self.window_bytes:
+            window = bytes(self._pending[:self.window_bytes])
+            del self._pending[:self.window_bytes]
+            self._add_window(window)
+
+    def _add_window(self, window: bytes):
+        self._segment.extend(window)
+        if window_rms(window) < LIVE_SILENCE_RMS:
+            self._silent_ms += WINDOW_MS
+        else:
+            self._silent_ms = 0
+            self._speech_seen = True
+
+        if not self._speech_seen:
+            # Do not send silence to the model, it tends to hallucinate words in it
+            keep = self.sample_rate * LEADING_SILENCE_MS // 1000 * 2
+            if len(self._segment) > keep:
+                del self._segment[:len(self._segment) - keep]
+            return
+
+        seconds = self._seconds(self._segment)
+        if (self._silent_ms >= LIVE_SILENCE_MS and seconds >= MIN_SEGMENT_SECONDS) or seconds >= LIVE_MAX_SEGMENT_SECONDS:
+            self._cut()
+
+    def _cut(self):
+        segment = bytes(self._segment)
+        self._segment = bytearray()
+        self._speech_seen = False
+        self._silent_ms = 0
+        index = len(self._tasks)
+        self._tasks.append(asyncio.create_task(self._transcribe_segment(index, segment)))
+
+    async def _transcribe_segment(self, index: int, pcm: bytes) -> str:
+        async with self._semaphore:
+            audio_path = write_wav(pcm, self.sample_rate)
+            try:
+                text = (await self.transcribe(audio_path) or "").strip()
+            finally:
+                os.unlink(audio_path)
+        if self.on_partial is not None and text:
+            await self.on_partial(index, text)
+        return text
+
+    async def finish(self) -> str:
+        """
+        Transcribe whatever is left and return the whole transcript in order.
+        """
+        self._segment.extend(self._pending)
+        self._pending = bytearray()
+        if self._speech_seen and self._segment:
+            self._cut()
+        texts = await asyncio.gather(*self._tasks)
+        return " ".join(text for text in texts if text)
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
@@ -0,0 +1,95 @@
+import asyncio
+import os
+
+# Most items sent upstream in one batched request
+POINT_BATCH_MAX_SIZE = int(os.getenv("POINT_BATCH_MAX_SIZE", "8"))
+
+# Milliseconds the first item of a batch waits for others to join it
+POINT_BATCH_WAIT_MS = float(os.getenv("POINT_BATCH_WAIT_MS", "15"))
+
+
+class MicroBatcher:
+    """
+    Collects items submitted by concurrent callers for a few milliseconds and processes them together.
+
+    A batch is sent as soon as it is full or when the first item has waited max_wait_ms, whichever
+    comes first, so a lone request pays at most the wait window. Every caller gets back the result
+    for its own item.
+    """
+
+    def __init__(self, process_batch, max_batch_size: int = POINT_BATCH_MAX_SIZE, max_wait_ms: float = POINT_BATCH_WAIT_MS):
+        """
+        Parameters:
+        - process_batch: Async callable taking a list of items and returning one result per item, in order
+        - max_batch_size: Most items processed in one call
+        - max_wait_ms: Longest time an item waits for the batch to fill
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._waiting = []  # (item, future) not sent yet
+        self._timer = None
+        self._running = set()  # Batches being processed
+        self.items = 0
+        self.batches = 0
+        self.full_batches = 0
+        self.largest_batch = 0
+
+    async def submit(self, item):
+        """
+        Add an item to the next batch and wait for its result.
+
+        Raises:
+        - Whatever process_batch raised for the batch the item was in
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append((item, future))
+        if len(self._waiting) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiting:
+            batch = self._waiting[:self.max_batch_size]
+            del self._waiting[:self.max_batch_size]
+            # Callers that gave up (e.g. a cancelled request) are not sent upstream
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+            self.items += len(batch)
+            self.batches += 1
+            self.full_batches += len(batch) == self.max_batch_size
+            self.largest_batch = max(self.largest_batch, len(batch))
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: list):
+        try:
+            results = await self.process_batch([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch of {len(batch)} items returned {len(results)} results")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "items": self.items,
+            "upstream_requests": self.batches,
+            "full_batches": self.full_batches,
+            "largest_batch": self.largest_batch,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
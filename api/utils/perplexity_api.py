@@ -1,24 +1,142 @@
+import asyncio
 import os
-from openai import OpenAI
+import re
+import unicodedata
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from utils.ttl_cache import TTLCache
 
-def search_perplexity(query: str) -> dict:
+# Number of normalized queries whose answers are kept
+PERPLEXITY_CACHE_SIZE = int(os.getenv("PERPLEXITY_CACHE_SIZE", "1024"))
+
+# Seconds an answer stays valid, search results go stale so keep this moderate
+PERPLEXITY_CACHE_TTL = float(os.getenv("PERPLEXITY_CACHE_TTL", "21600"))
+
+# Maximum number of Perplexity requests in flight at once per worker
+PERPLEXITY_MAX_CONCURRENCY = int(os.getenv("PERPLEXITY_MAX_CONCURRENCY", "8"))
+
+# Seconds before a Perplexity request is abandoned
+PERPLEXITY_TIMEOUT = float(os.getenv("PERPLEXITY_TIMEOUT", "30"))
+
+_cache = TTLCache(PERPLEXITY_CACHE_SIZE, PERPLEXITY_CACHE_TTL)
+
+# Identical queries already being searched: normalized query -> future with the answer
+_inflight = {}
+
+_search_stats = {"upstream_calls": 0, "coalesced": 0}
+
+# Long-lived client so TLS sessions and pooled connections are reused across searches
+_client = None
+_semaphore = asyncio.Semaphore(PERPLEXITY_MAX_CONCURRENCY)
+
+
+def init_perplexity_client() -> AsyncOpenAI:
+    """
+    Create the shared Perplexity client. Called at startup, and lazily on first use otherwise.
+    """
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=os.getenv("PERPLEXITY_API_KEY"),
+            base_url="https://api.perplexity.ai",
+            timeout=PERPLEXITY_TIMEOUT,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=PERPLEXITY_MAX_CONCURRENCY,
+                    max_keepalive_connections=PERPLEXITY_MAX_CONCURRENCY,
+                    keepalive_expiry=60,
+                )
+            ),
+        )
+    return _client
+
+
+async def close_perplexity_client():
+    """
+    Close the shared Perplexity client and its connection pool.
+    """
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query so trivially different phrasings share a cache entry.
+    Case, accents, punctuation and repeated whitespace are ignored.
+    """
+    decomposed = unicodedata.normalize("NFKD", query)
+    without_accents = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^\w]+", " ", without_accents.casefold()).split())
+
+
+async def search_perplexity(query: str) -> dict:
     """
     Perform a search using the Perplexity API via OpenAI client.
-    
+
+    Answers are cached by normalized query, and concurrent identical queries share a single
+    upstream call.
+
     Parameters:
     - query: The search query
-    
+
     Returns:
     - Search results in JSON format
     """
+    key = normalize_query(query)
+    cached = _cache.get(key)
+    if cached is not None:
+        print(f"Perplexity cache hit for query: {query}")
+        return cached
+
+    inflight = _inflight.get(key)
+    if inflight is not None:
+        # Someone is already asking the same thing, wait for their answer
+        _search_stats["coalesced"] += 1
+        try:
+            return await asyncio.shield(inflight)
+        except asyncio.CancelledError:
+            if not inflight.done():
+                raise  # This caller was cancelled itself
+            # The leading call was cancelled, search again
+            return await search_perplexity(query)
+
+    inflight = asyncio.get_running_loop().create_future()
+    _inflight[key] = inflight
+    try:
+        result = await _search_upstream(query)
+        # Errors are not cached so the next caller retries
+        if isinstance(result, str):
+            _cache.set(key, result)
+        inflight.set_result(result)
+        return result
+    except BaseException as e:
+        # Cancelled leaders must not leave the waiters hanging
+        inflight.set_exception(e)
+        inflight.exception()  # Mark as retrieved in case nobody was waiting
+        raise
+    finally:
+        _inflight.pop(key, None)
+
+
+def get_search_stats() -> dict:
+    """
+    Return cache and coalescing counters for monitoring.
+    """
+    stats = {**_cache.stats(), **_search_stats, "in_flight": len(_inflight)}
+    # Share of searches answered without their own upstream call (cache hits plus coalesced waits)
+    total = stats["hits"] + stats["misses"]
+    stats["effective_hit_rate"] = round((stats["hits"] + stats["coalesced"]) / total, 4) if total else 0.0
+    return stats
+
+
+async def _search_upstream(query: str) -> dict:
     print(f"Performing Perplexity API search for query: {query}")
+    _search_stats["upstream_calls"] += 1
     try:
-        # Initialize the OpenAI client
-        client = OpenAI(
-            api_key=os.getenv("PERPLEXITY_API_KEY"),
-            base_url="https://api.perplexity.ai"
-        )
-        
+        client = init_perplexity_client()
+
         # Prepare the messages for the chat completion
         messages = [
             {
@@ -28,22 +146,23 @@ def search_perplexity(query: str) -> dict:
                     "helpful, and polite answers to the user's input. Don't be verbose"
                 ),
             },
-            {   
+            {
                 "role": "user",
                 "content": query,
             },
         ]
-        
+
         # Perform the chat completion
-        response = client.chat.completions.create(
-            model="sonar",
-            messages=messages,
-        )
+        async with _semaphore:
+            response = await client.chat.completions.create(
+                model="sonar",
+                messages=messages,
+            )
 
         # print(response)
 
         print("We have perplexity answer!")
-        
+
         # return {"status": "success", "query": query, "results": response}
         return response.choices[0].message.content
     except Exception as e:
@@ -0,0 +1,272 @@
+import json
+import os
+import threading
+import time
+
+from utils.point_index import normalize_point
+
+# Points listed per segment in /analytics/points/
+ANALYTICS_TOP_K = int(os.getenv("ANALYTICS_TOP_K", "20"))
+
+# Distinct countries tracked, later ones are grouped under "other"
+ANALYTICS_MAX_COUNTRIES = int(os.getenv("ANALYTICS_MAX_COUNTRIES", "100"))
+
+# File the aggregates are snapshotted to and restored from on start
+ANALYTICS_SNAPSHOT_FILE = os.getenv(
+    "ANALYTICS_SNAPSHOT_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "point_analytics.json"),
+)
+
+# Seconds between snapshots, only taken when something changed
+ANALYTICS_SNAPSHOT_INTERVAL = float(os.getenv("ANALYTICS_SNAPSHOT_INTERVAL", "60"))
+
+# Seconds the served aggregates may lag behind the counters
+ANALYTICS_VIEW_MAX_AGE = 2.0
+
+# Counters kept per top-K list; more than K so the reported counts stay close to exact
+COUNTERS_PER_TOP_K = 3
+
+# Upper bounds of the age bands, the last band is open-ended
+AGE_BANDS = [(18, "<18"), (25, "18-24"), (35, "25-34"), (45, "35-44"), (55, "45-54"), (65, "55-64")]
+
+
+def age_band(age) -> str:
+    """
+    Return the age band of an age from user_data, or None if it is missing or not plausible.
+    """
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return None
+    if age <= 0 or age > 120:
+        return None
+    for upper, band in AGE_BANDS:
+        if age < upper:
+            return band
+    return "65+"
+
+
+class SpaceSaving:
+    """
+    Approximate top-K counter in fixed memory (the Space-Saving algorithm).
+
+    Keeps at most capacity counters. A new key takes over the smallest counter and inherits its
+    count as possible overestimation, so any key counted more often than total / capacity times
+    is guaranteed to be listed, with a count off by at most its error.
+    """
+
+    __slots__ = ("capacity", "_counters")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._counters = {}  # key -> [count, error, label]
+
+    def add(self, key: str, label: str, amount: int = 1):
+        entry = self._counters.get(key)
+        if entry is not None:
+            entry[0] += amount
+            return
+        if len(self._counters) < self.capacity:
+            self._counters[key] = [amount, 0, label]
+            return
+        smallest = min(self._counters, key=lambda counter_key: self._counters[counter_key][0])
+        floor = self._counters.pop(smallest)[0]
+        self._counters[key] = [floor + amount, floor, label]
+
+    def top(self, count: int) -> list:
+        ranked = sorted(self._counters.values(), key=lambda entry: entry[0], reverse=True)[:count]
+        return [{"point": label, "count": total, "error": error} for total, error, label in ranked]
+
+    def to_list(self) -> list:
+        return [[key] + entry for key, entry in self._counters.items()]
+
+    @classmethod
+    def from_list(cls, capacity: int, data: list) -> "SpaceSaving":
+        counter = cls(capacity)
+        for key, total, error, label in sorted(data or [], key=lambda item: item[1], reverse=True)[:capacity]:
+            counter._counters[key] = [total, error, label]
+        return counter
+
+
+class SegmentStats:
+    """
+    Counters for one slice of the user base (everyone, one country or one age band).
+    """
+
+    __slots__ = ("reports", "pain_mentions", "good_mentions", "pain", "good")
+
+    def __init__(self, capacity: int):
+        self.reports = 0  # Turns that brought at least one new point
+        self.pain_mentions = 0
+        self.good_mentions = 0
+        self.pain = SpaceSaving(capacity)
+        self.good = SpaceSaving(capacity)
+
+    def to_dict(self) -> dict:
+        return {
+            "reports": self.reports,
+            "pain_mentions": self.pain_mentions,
+            "good_mentions": self.good_mentions,
+            "pain": self.pain.to_list(),
+            "good": self.good.to_list(),
+        }
+
+    @classmethod
+    def from_dict(cls, capacity: int, data: dict) -> "SegmentStats":
+        segment = cls(capacity)
+        segment.reports = data.get("reports", 0)
+        segment.pain_mentions = data.get("pain_mentions", 0)
+        segment.good_mentions = data.get("good_mentions", 0)
+        segment.pain = SpaceSaving.from_list(capacity, data.get("pain"))
+        segment.good = SpaceSaving.from_list(capacity, data.get("good"))
+        return segment
+
+
+class PointAnalytics:
+    """
+    Pain and good points aggregated across users, overall and per country and age band.
+
+    Every point is counted once per user session, the first time it comes up, so the counts read
+    as "users who mentioned it". Memory is bounded by the number of segments times the top-K
+    counters. The served aggregates are rebuilt at most every ANALYTICS_VIEW_MAX_AGE seconds, so
+    dashboards polling the endpoint cost a dict lookup, and a background thread snapshots the
+    counters to disk so they survive restarts.
+    """
+
+    def __init__(self, snapshot_path: str = ANALYTICS_SNAPSHOT_FILE, top_k: int = ANALYTICS_TOP_K, snapshot_interval: float = ANALYTICS_SNAPSHOT_INTERVAL):
+        self.snapshot_path = snapshot_path
+        self.top_k = top_k
+        self.capacity = top_k * COUNTERS_PER_TOP_K
+        self._segments = {}  # "all", "country:<name>" or "age:<band>" -> SegmentStats
+        self._lock = threading.Lock()
+        self._version = 0
+        self._saved_version = 0
+        self._view = None
+        self._view_version = -1
+        self._view_built_at = 0.0
+        self.snapshots = 0
+        self._load()
+        self._stop = threading.Event()
+        self._snapshotter = threading.Thread(target=self._snapshot_loop, args=(snapshot_interval,), name="point-analytics-snapshot", daemon=True)
+        self._snapshotter.start()
+
+    def _segment_names(self, user_data: dict) -> list:
+        names = ["all"]
+        country = str(user_data.get("country") or "").strip()
+        if country:
+            name = f"country:{country}"
+            countries = sum(1 for segment in self._segments if segment.startswith("country:"))
+            if name not in self._segments and countries >= ANALYTICS_MAX_COUNTRIES:
+                name = "country:other"
+            names.append(name)
+        band = age_band(user_data.get("age"))
+        if band:
+            names.append(f"age:{band}")
+        return names
+
+    def record(self, user_data: dict, pain_points: list, good_points: list):
+        """
+        Count points that are new for a user.
+
+        Parameters:
+        - user_data: The user's profile, for the country and age segments
+        - pain_points, good_points: Points the user mentioned for the first time
+        """
+        if not pain_points and not good_points:
+            return
+        pain = [(normalize_point(point), point) for point in pain_points]
+        good = [(normalize_point(point), point) for point in good_points]
+        with self._lock:
+            for name in self._segment_names(user_data or {}):
+                segment = self._segments.get(name)
+                if segment is None:
+                    segment = self._segments[name] = SegmentStats(self.capacity)
+                segment.reports += 1
+                segment.pain_mentions += len(pain)
+                segment.good_mentions += len(good)
+                for key, label in pain:
+                    segment.pain.add(key, label)
+                for key, label in good:
+                    segment.good.add(key, label)
+            self._version += 1
+
+    def view(self) -> dict:
+        """
+        Return the aggregates for dashboards: per segment, its counters and top pain and good points.
+        """
+        now = time.time()
+        if self._view is not None and (self._view_version == self._version or now - self._view_built_at < ANALYTICS_VIEW_MAX_AGE):
+            return self._view
+        with self._lock:
+            version = self._version
+            segments = {
+                name: {
+                    "reports": segment.reports,
+                    "pain_mentions": segment.pain_mentions,
+                    "good_mentions": segment.good_mentions,
+                    "top_pain_points": segment.pain.top(self.top_k),
+                    "top_good_points": segment.good.top(self.top_k),
+                }
+                for name, segment in self._segments.items()
+            }
+        self._view = {"updated_at": now, "segments": segments}
+        self._view_version = version
+        self._view_built_at = now
+        return self._view
+
+    def _load(self):
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Error loading point analytics snapshot {self.snapshot_path}: {e}")
+            return
+        self._segments = {
+            name: SegmentStats.from_dict(self.capacity, segment) for name, segment in data.get("segments", {}).items()
+        }
+        print(f"Loaded point analytics for {len(self._segments)} segments from {self.snapshot_path}")
+
+    def snapshot(self):
+        """
+        Write the counters to the snapshot file if they changed since the last snapshot.
+        """
+        with self._lock:
+            version = self._version
+            if version == self._saved_version:
+                return
+            data = {"saved_at": time.time(), "segments": {name: segment.to_dict() for name, segment in self._segments.items()}}
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+            temp_path = f"{self.snapshot_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(data, file, ensure_ascii=False)
+            os.replace(temp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"Error saving point analytics snapshot: {e}")
+            return
+        self._saved_version = version
+        self.snapshots += 1
+
+    def _snapshot_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            self.snapshot()
+
+    def close(self):
+        """
+        Stop the background snapshots and write a last one.
+        """
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._snapshotter.join()
+        self.snapshot()
+
+    def stats(self) -> dict:
+        return {
+            "segments": len(self._segments),
+            "top_k": self.top_k,
+            "snapshots": self.snapshots,
+            "unsaved_changes": self._version != self._saved_version,
+        }
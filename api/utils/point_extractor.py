@@ -0,0 +1,289 @@
+"""
+Local pain/good-point extraction.
+
+Common messages ("no llego a fin de mes", "estoy contento con el servicio") are labelled in-process
+with pattern rules over the accent and case folded message, using the same categories the LLM
+extraction prompt asks for. Every result carries a confidence; messages the rules cannot settle
+(a negated cue, a complaint without a known topic, a mood word, or no match at all) get a low one
+and are escalated to the LLM by the caller. A match is only trusted when it explains the whole
+message: messages with only good points, a contrast ("pero", "aunque"), or a mood or topic word
+outside the matched text that no found point accounts for are escalated too. Only greetings, thanks and short impersonal
+questions are settled locally as having no points.
+
+Benchmark the rules against a labelled set from the api directory:
+
+    python -m utils.point_extractor        # compare with the labels in data/point_labels.jsonl
+                                           # (reported separately for the "tuning" and "held_out" messages)
+    python -m utils.point_extractor --llm  # also label every message with the LLM and compare
+    python -m utils.point_extractor --check  # exit with status 1 if a message settled locally disagrees with its labels
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+
+from utils.pre_router import fold
+
+# "hybrid": rules first, the LLM only for low-confidence messages
+# "local": rules only, never calls the LLM
+# "llm": every message goes to the LLM, as before
+POINT_EXTRACTOR = os.getenv("POINT_EXTRACTOR", "hybrid").lower()
+
+# Confidence (0-1) under which a "hybrid" extraction is escalated to the LLM
+POINT_EXTRACTOR_MIN_CONFIDENCE = float(os.getenv("POINT_EXTRACTOR_MIN_CONFIDENCE", "0.6"))
+
+POINT_LABELS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "point_labels.jsonl")
+
+# (label, "pain" or "good", pattern over folded text, weight). The weight only decides which
+# problem is kept when several match, since the LLM prompt asks for one problem per message.
+RULES = [
+    ("problemas financieros", "pain", r"no (llego|llegamos) a fin de mes|no me alcanza|(pagar|pago) (mis |las )?(facturas|deudas|cuentas)|deuda|problemas? (de|con el) dinero|problemas economicos|dificultades economicas|sin (dinero|ahorros)|no tengo dinero|arruinad|prestamo", 3),
+    ("preocupaciones de salud", "pain", r"enferm|dolor|sintoma|me siento mal|(preocupad\w*|problemas?) (por|con|de) (mi |la )?salud|ansiedad|depresion|estres|fiebre|no puedo dormir|insomnio", 3),
+    ("desafíos laborales", "pain", r"(no (puedo|consigo) )?(encontrar|buscar|busco|buscando|perdi|perder|sin|quedado sin) (un |el |mi )?(trabajo|empleo)|desemplead|en paro|me (han )?despedido|despido", 3),
+    ("problemas de vivienda", "pain", r"alquiler (muy |demasiado )?caro|no (encuentro|consigo) (piso|casa|vivienda)|desahucio|me echan de (mi )?(piso|casa)|problemas? con (el|mi) (casero|alquiler|piso)", 2),
+    ("problemas con pagos", "pain", r"pago (fue |ha sido )?rechazad|(tarjeta|transaccion|compra) (fue |ha sido )?rechazad|cobro (doble|duplicado|indebido)|me (han )?cobrado dos veces|no me (han )?devuelto|reembolso", 3),
+    ("trámites migratorios", "pain", r"(renovar|tramitar|conseguir|pedir|solicitar) (mi |el |la |un |una )?(visa|visado|pasaporte|permiso de residencia|permiso de trabajo|nie|residencia)|regularizar|sin papeles|me (han )?denegado (la |el )?(visa|visado|asilo)", 2),
+    ("insatisfacción con el servicio", "pain", r"(mal|pesimo|fatal|horrible) servicio|servicio (es )?(malo|pesimo|horrible)|no funciona|quiero (poner )?una queja|estoy (muy )?(molest|enfadad|decepcionad)", 2),
+    ("costos de energía", "pain", r"factura de la luz|(luz|electricidad|gas|energia) (esta |es )?(muy |demasiado )?cara|precio de la (luz|electricidad|energia)", 2),
+    ("preocupaciones climáticas", "pain", r"ola de calor|sequia|inundac|contaminacion|cambio climatico", 1),
+    ("satisfacción con el servicio", "good", r"(contento|content[ao]s|satisfech\w*|encantad\w*) con (el |la |los |vuestro |su )?(servicio|app|aplicacion|ayuda|plataforma)|(buen|excelente|gran) servicio|funciona (muy )?bien", 1),
+    ("atención al cliente", "good", r"(me gusta|buena|excelente|gran) (la )?atencion|atencion (al cliente )?(es |fue )?(buena|excelente|genial)|me (han )?atendido (muy )?bien|me atendieron (muy )?bien", 1),
+    ("salud y bienestar", "good", r"me encuentro (bien|con salud)|(buena|excelente) salud|estoy san[oa]|me siento (bien|genial|muy bien)", 1),
+    ("estabilidad laboral", "good", r"(tengo|he encontrado|consegui|encontre) (un )?(buen |nuevo )?(trabajo|empleo)|me han contratado|trabajo (fijo|estable)", 1),
+    ("estabilidad financiera", "good", r"(tengo|he) ahorr\w*|(pague|he pagado|saldado) (todas )?(mis |las )?deudas|me va bien (economicamente|de dinero)", 1),
+]
+COMPILED_RULES = [(label, kind, re.compile(r"\b(?:" + pattern + r")"), weight) for label, kind, pattern, weight in RULES]
+
+# A match right after one of these words is negated ("no tengo deudas", "sin dolor")
+NEGATION_PATTERN = re.compile(r"\b(no|sin|nunca|ningun|ninguna|tampoco|ni)\s+(\w+\s+){0,2}$")
+
+# Words that usually mean the message carries a problem or a compliment the rules did not label
+SENTIMENT_CUES = re.compile(
+    r"\b(problema\w*|preocup\w*|dificil\w*|miedo|me cuesta|agobi\w*|triste|mal|fatal|"
+    r"no puedo|me siento|ayuda|contento|feliz|me gusta|encanta|genial|gracias a)\b"
+)
+
+# Praise among the SENTIMENT_CUES, a good point the rules missed when it is left outside the matches
+GOOD_CUES = re.compile(r"\b(contento|feliz|me gusta|encanta|genial|gracias a)\b")
+
+# Nouns of the rule topics and the labels they belong to. Left outside the matched text with none of
+# their labels found, they mean the message says more than the match ("estrés por el alquiler" is
+# about housing, not only health)
+FINANCES, HEALTH, WORK, HOUSING, PAYMENTS, PAPERS, ENERGY = (
+    "problemas financieros", "preocupaciones de salud", "desafíos laborales", "problemas de vivienda",
+    "problemas con pagos", "trámites migratorios", "costos de energía",
+)
+SERVICE = ("insatisfacción con el servicio", "satisfacción con el servicio", "atención al cliente")
+TOPIC_WORDS = {
+    "dinero": {FINANCES, PAYMENTS}, "sueldo": {FINANCES, WORK}, "salario": {FINANCES, WORK},
+    "deuda": {FINANCES}, "deudas": {FINANCES}, "banco": {FINANCES}, "prestamo": {FINANCES},
+    "hipoteca": {FINANCES, HOUSING}, "alquiler": {HOUSING}, "piso": {HOUSING}, "vivienda": {HOUSING},
+    "casero": {HOUSING}, "trabajo": {WORK, "estabilidad laboral"}, "empleo": {WORK, "estabilidad laboral"},
+    "jefe": {WORK}, "contrato": {WORK}, "salud": {HEALTH, "salud y bienestar"}, "medico": {HEALTH},
+    "hospital": {HEALTH}, "visa": {PAPERS}, "visado": {PAPERS}, "papeles": {PAPERS}, "residencia": {PAPERS},
+    "luz": {ENERGY}, "electricidad": {ENERGY}, "pago": {PAYMENTS}, "tarjeta": {PAYMENTS},
+    "servicio": set(SERVICE), "atencion": set(SERVICE),
+}
+
+# The message weighs one thing against another, so a single match is only half of it
+CONTRAST_PATTERN = re.compile(r"\b(pero|aunque|sin embargo)\b")
+
+# Messages that carry nothing to label: greetings, thanks and acknowledgements made only of these words...
+SMALL_TALK_WORDS = {
+    "hola", "buenas", "buenos", "buen", "dia", "dias", "tardes", "noches", "que", "tal", "como", "estas",
+    "esta", "gracias", "muchas", "mil", "vale", "ok", "okay", "perfecto", "de", "acuerdo", "entendido",
+    "adios", "hasta", "luego", "pronto", "si", "claro", "bien", "muy", "todo", "y", "tu", "usted",
+}
+# ...and short impersonal questions ("¿cuál es la inflación en Colombia?"), unless the user talks about themselves
+QUESTION_PATTERN = re.compile(r"^(que|cual|cuales|cuanto|cuanta|cuantos|cuantas|como|donde|cuando|quien|hay|existe)\b")
+FIRST_PERSON_PATTERN = re.compile(r"\b(yo|me|mi|mis|tengo|estoy|necesito|quiero|puedo|busco|llevo|siento|no se)\b")
+MAX_QUESTION_WORDS = 12
+WORD_PATTERN = re.compile(r"\w+")
+
+CONFIDENT = 0.9
+SEVERAL_PROBLEMS = 0.7
+SMALL_TALK = 0.85
+NOTHING_TO_LABEL = 0.4
+UNCERTAIN = 0.3
+
+
+class LocalPoints:
+    """
+    Points found by the rules and how sure they are.
+    """
+    __slots__ = ("pain_points", "good_points", "confidence")
+
+    def __init__(self, pain_points: list, good_points: list, confidence: float):
+        self.pain_points = pain_points
+        self.good_points = good_points
+        self.confidence = confidence
+
+
+def extract_points_locally(text: str) -> LocalPoints:
+    """
+    Label a user message with the rules.
+
+    Parameters:
+    - text: The user's own message, without the user context
+
+    Returns:
+    - The pain and good points found and a confidence between 0 and 1
+    """
+    folded = " ".join(fold(text).split())
+    pain = {}  # label -> weight
+    good = []
+    spans = []  # (start, end) of the matches used
+    negated = False
+    for label, kind, pattern, weight in COMPILED_RULES:
+        for match in pattern.finditer(folded):
+            if NEGATION_PATTERN.search(folded[:match.start()]):
+                negated = True
+                continue
+            spans.append(match.span())
+            if kind == "pain":
+                pain[label] = max(pain.get(label, 0), weight)
+            elif label not in good:
+                good.append(label)
+            break
+
+    if negated and not pain and not good:
+        # "no estoy contento con el servicio" could be a complaint, let the LLM read it
+        return LocalPoints([], [], UNCERTAIN)
+    if pain or good:
+        # Only one problem per message, like the LLM prompt asks for
+        pain_points = [max(pain, key=pain.get)] if pain else []
+        if not pain or not explains_message(folded, spans, set(pain) | set(good), bool(good)):
+            # "tengo trabajo pero el sueldo no me llega" also has a problem the rules missed
+            return LocalPoints(pain_points, good, UNCERTAIN)
+        return LocalPoints(pain_points, good, CONFIDENT if len(pain) <= 1 else SEVERAL_PROBLEMS)
+    if SENTIMENT_CUES.search(folded):
+        return LocalPoints([], [], UNCERTAIN)
+    if is_small_talk(folded):
+        return LocalPoints([], [], SMALL_TALK)
+    # No rule matched, but the message may still hold a point the rules do not know about
+    # ("la luz está carísima"), so let the LLM read it
+    return LocalPoints([], [], NOTHING_TO_LABEL)
+
+
+def explains_message(folded: str, spans: list, labels: set, has_good: bool) -> bool:
+    """
+    Tell whether the matches cover the message: no contrast, no praise left when no good point was
+    found, and no topic word outside the matches whose labels were not found.
+    """
+    if CONTRAST_PATTERN.search(folded):
+        return False
+    rest = folded
+    for start, end in spans:
+        rest = rest[:start] + " " * (end - start) + rest[end:]
+    if not has_good and GOOD_CUES.search(rest):
+        return False
+    return all(TOPIC_WORDS[word] & labels for word in WORD_PATTERN.findall(rest) if word in TOPIC_WORDS)
+
+
+def is_small_talk(folded: str) -> bool:
+    """
+    Tell greetings, thanks and short impersonal questions, which never carry pain or good points.
+    """
+    words = WORD_PATTERN.findall(folded)
+    if words and all(word in SMALL_TALK_WORDS for word in words):
+        return True
+    text = " ".join(words)
+    return (
+        QUESTION_PATTERN.match(text) is not None
+        and len(text.split()) <= MAX_QUESTION_WORDS
+        and FIRST_PERSON_PATTERN.search(text) is None
+    )
+
+
+def load_labels(path: str = POINT_LABELS_FILE) -> list:
+    with open(path, "r", encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def _label_set(points) -> set:
+    return {fold(point).strip() for point in points}
+
+
+def compare(predicted_pain, predicted_good, expected_pain, expected_good) -> bool:
+    return _label_set(predicted_pain) == _label_set(expected_pain) and _label_set(predicted_good) == _label_set(expected_good)
+
+
+def _percent(count: int, total: int) -> str:
+    return f"{count / total:.0%}" if total else "n/a"
+
+
+def _report(name: str, rows: list, min_confidence: float, verbose: bool):
+    """
+    Print the benchmark for one split. rows holds (example, local result, LLM result or None).
+    """
+    total = len(rows)
+    with_llm = bool(rows) and rows[0][2] is not None
+    resolved = agreed_resolved = agreed_all = agreed_hybrid = agreed_llm = llm_vs_labels = 0
+    for example, local, llm in rows:
+        agrees = compare(local.pain_points, local.good_points, example["pain_points"], example["good_points"])
+        agreed_all += agrees
+        if local.confidence >= min_confidence:
+            resolved += 1
+            agreed_resolved += agrees
+            agreed_hybrid += agrees
+        else:
+            if verbose:
+                print(f"escalated: {example['message']}")
+            if with_llm:
+                # Escalated messages are answered by the LLM, so the hybrid result is its answer
+                agreed_hybrid += compare(llm.pain_points, llm.good_points, example["pain_points"], example["good_points"])
+        if not agrees and verbose:
+            print(f"mismatch: {example['message']} -> pain={local.pain_points} good={local.good_points}")
+        if with_llm:
+            agreed_llm += compare(local.pain_points, local.good_points, llm.pain_points, llm.good_points)
+            llm_vs_labels += compare(llm.pain_points, llm.good_points, example["pain_points"], example["good_points"])
+
+    print(f"[{name}] Messages: {total}")
+    print(f"[{name}] Resolved locally: {resolved} ({_percent(resolved, total)})")
+    print(f"[{name}] Agreement with labels, all messages: {_percent(agreed_all, total)}")
+    print(f"[{name}] Agreement with labels, resolved messages: {_percent(agreed_resolved, resolved)}")
+    print(f"[{name}] Hybrid agreement with labels: {_percent(agreed_hybrid, total) if with_llm else 'n/a (needs --llm)'}")
+    if with_llm:
+        print(f"[{name}] Agreement with the live LLM, all messages: {_percent(agreed_llm, total)}")
+        print(f"[{name}] Live LLM agreement with labels: {_percent(llm_vs_labels, total)}")
+
+
+async def _main(args):
+    examples = load_labels(args.labels)
+    llm_labels = [None] * len(examples)
+    if args.llm:
+        # Imported here so the plain benchmark runs without API keys
+        from agent_manager import extract_points_with_llm
+        llm_labels = [await extract_points_with_llm(example["message"]) for example in examples]
+
+    # "tuning" messages were written alongside the rules, "held_out" ones never used to adjust them
+    splits = {}
+    for example, llm in zip(examples, llm_labels):
+        row = (example, extract_points_locally(example["message"]), llm)
+        splits.setdefault(example.get("split", "tuning"), []).append(row)
+    for name, rows in splits.items():
+        _report(name, rows, args.min_confidence, args.verbose)
+
+    if not args.check:
+        return 0
+    # Settled messages never reach the LLM, so a wrong one is a wrong answer for the user
+    failures = 0
+    for rows in splits.values():
+        for example, local, _ in rows:
+            if local.confidence >= args.min_confidence and not compare(local.pain_points, local.good_points, example["pain_points"], example["good_points"]):
+                failures += 1
+                print(f"wrong local answer: {example['message']} -> pain={local.pain_points} good={local.good_points} (confidence {local.confidence})")
+    print(f"Wrong local answers: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the local point extractor against labelled messages.")
+    parser.add_argument("--labels", default=POINT_LABELS_FILE, help="JSONL file with message, pain_points and good_points")
+    parser.add_argument("--min-confidence", type=float, default=POINT_EXTRACTOR_MIN_CONFIDENCE, help="Confidence needed to skip the LLM")
+    parser.add_argument("--llm", action="store_true", help="Also label every message with the LLM and compare")
+    parser.add_argument("--verbose", action="store_true", help="Print escalated and mismatched messages")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if a message settled locally disagrees with its labels")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
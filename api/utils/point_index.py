@@ -0,0 +1,126 @@
+import json
+import os
+import re
+
+from utils.pre_router import fold
+
+# Optional JSON file with extra {"variant": "canonical point"} pairs merged into POINT_SYNONYMS
+POINT_SYNONYMS_FILE = os.getenv("POINT_SYNONYMS_FILE", "")
+
+# Variants the extraction tends to produce for the same point, folded like the keys they map to
+POINT_SYNONYMS = {
+    "problemas economicos": "problemas financieros",
+    "dificultades economicas": "problemas financieros",
+    "dificultades financieras": "problemas financieros",
+    "preocupaciones financieras": "problemas financieros",
+    "problemas de dinero": "problemas financieros",
+    "problemas de salud": "preocupaciones de salud",
+    "preocupacion por la salud": "preocupaciones de salud",
+    "problemas laborales": "desafios laborales",
+    "dificultades laborales": "desafios laborales",
+    "desempleo": "desafios laborales",
+    "busqueda de empleo": "desafios laborales",
+    "buena atencion al cliente": "atencion al cliente",
+    "satisfaccion con la atencion": "atencion al cliente",
+    "satisfaccion con el servicio al cliente": "satisfaccion con el servicio",
+    "bienestar": "salud y bienestar",
+    "buena salud": "salud y bienestar",
+}
+
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s]")
+
+
+def _load_synonyms() -> dict:
+    synonyms = dict(POINT_SYNONYMS)
+    if POINT_SYNONYMS_FILE:
+        try:
+            with open(POINT_SYNONYMS_FILE, "r", encoding="utf-8") as file:
+                for variant, canonical in json.load(file).items():
+                    synonyms[normalize_point(variant, {})] = normalize_point(canonical, {})
+        except (OSError, ValueError) as e:
+            print(f"Error loading point synonyms from {POINT_SYNONYMS_FILE}: {e}")
+    return synonyms
+
+
+def normalize_point(point: str, synonyms: dict = None) -> str:
+    """
+    Key a point by its meaning: accents, case, punctuation and spacing are ignored and known
+    variants map to their canonical point, so "Problemas económicos." and "problemas financieros"
+    are the same key.
+    """
+    key = " ".join(PUNCTUATION_PATTERN.sub(" ", fold(point)).split())
+    synonyms = point_synonyms if synonyms is None else synonyms
+    return synonyms.get(key, key)
+
+
+point_synonyms = _load_synonyms()
+
+
+class PointIndex:
+    """
+    A user's pain or good points, deduplicated by normalized key.
+
+    Points keep the wording and position of their first mention, and count how often they came up.
+    Inserting is a dict lookup, so merging a turn never rebuilds the list.
+    """
+
+    __slots__ = ("_entries",)
+
+    def __init__(self):
+        self._entries = {}  # key -> [label as first seen, mentions], in first-seen order
+
+    def add(self, label: str) -> bool:
+        """
+        Record one mention of a point.
+
+        Returns:
+        - True if the point is new for this user
+        """
+        label = label.strip()
+        if not label:
+            return False
+        key = normalize_point(label)
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[1] += 1
+            return False
+        self._entries[key] = [label, 1]
+        return True
+
+    def update(self, labels) -> list:
+        """
+        Record several mentions and return the labels that were new.
+        """
+        return [label for label in labels if self.add(label)]
+
+    def labels(self) -> list:
+        return [label for label, _ in self._entries.values()]
+
+    def counts(self) -> dict:
+        return {label: mentions for label, mentions in self._entries.values()}
+
+    def __iter__(self):
+        return iter(self.labels())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def to_list(self) -> list:
+        """
+        Compact form for the session spill files: [[label, mentions], ...] in first-seen order.
+        """
+        return [list(entry) for entry in self._entries.values()]
+
+    @classmethod
+    def from_list(cls, data: list) -> "PointIndex":
+        """
+        Rebuild an index from to_list(), or from a plain list of labels as older sessions stored them.
+        """
+        index = cls()
+        for item in data or []:
+            label, mentions = (item, 1) if isinstance(item, str) else item
+            label = label.strip()
+            if label:
+                # Synonyms added since the session was stored fold into one entry here
+                index._entries.setdefault(normalize_point(label), [label, 0])[1] += mentions
+        return index
@@ -0,0 +1,280 @@
+"""
+Local keyword router that sends unambiguous messages straight to a specialist agent.
+
+Every agent gets a score from the domain lexicon below and from the words of its
+handoff_description. Lexicon entries are stems matched against the start of each word after
+accent and case folding ("factura" matches "facturas", "rechaz" matches "rechazado"); entries
+ending in "$" only match the whole word, for stems that start words of other domains ("calor$"
+must not match "calorias"), and entries of several words are matched as phrases and weigh more.
+The message is routed when it holds enough evidence (two stems or one phrase) and the best agent
+clearly beats the runner-up, otherwise the supervisor decides as before.
+
+Check the routing of the labelled messages in data/route_labels.jsonl from the api directory:
+
+    python -m utils.pre_router            # exits with status 1 if any message is routed wrongly
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import unicodedata
+
+# Set to false to send every message through the supervisor
+PRE_ROUTER_ENABLED = os.getenv("PRE_ROUTER_ENABLED", "true").lower() == "true"
+
+# Confidence (0-1) above which a message skips the supervisor
+PRE_ROUTER_THRESHOLD = float(os.getenv("PRE_ROUTER_THRESHOLD", "0.6"))
+
+# Lexicon evidence a message needs before it is routed: a stem counts 1, a phrase 2 and a
+# handoff_description word 0.5, so a single stem ("Tengo migraña" -> "migra") is never enough
+PRE_ROUTER_MIN_SCORE = float(os.getenv("PRE_ROUTER_MIN_SCORE", "2"))
+
+# Share of routed messages also sent to the supervisor in the background to measure accuracy
+PRE_ROUTER_AUDIT_RATE = float(os.getenv("PRE_ROUTER_AUDIT_RATE", "0.1"))
+
+# Agents never picked by the router, comma separated
+PRE_ROUTER_EXCLUDE = [name.strip() for name in os.getenv("PRE_ROUTER_EXCLUDE", "Final Output Agent").split(",") if name.strip()]
+
+# Domain vocabulary of each agent, already folded to lowercase without accents
+DOMAIN_LEXICON = {
+    "Emigration Agent": [
+        "visa", "visado", "pasaporte", "emigr", "inmigr", "migracion$", "migrante$", "migrantes$",
+        "migrar$", "migratori", "residencia", "asilo", "refugi",
+        "extranjer", "ciudadania", "nacionalidad", "consulado", "embajada", "arraigo",
+        "permiso de trabajo", "vivir en otro pais", "mudarme a",
+    ],
+    "Government Agent": [
+        "ley", "leyes", "legal$", "ilegal$", "tramit", "gobierno", "ayuntamiento", "municip", "dni", "nie",
+        "empadrona", "multa", "denuncia", "abogado", "juzgado", "subsidio", "seguridad social",
+        "ayuda publica", "registro civil", "certificado",
+    ],
+    "Health Agent": [
+        "medico$", "medicos$", "medica$", "medicina$", "medicament", "salud", "hospital", "enferm",
+        "doctor", "dolor", "sintoma", "vacun", "clinica", "farmacia", "embaraz", "ansiedad", "depresion",
+        "fiebre", "covid", "cita medica", "seguro medico", "receta medica",
+    ],
+    "Money Agent": [
+        "dinero", "banco", "bancari", "prestamo", "credito", "deuda", "factura", "ahorr", "hipoteca",
+        "inversion", "invertir", "salario", "sueldo", "presupuesto", "divisa", "remesa",
+        "tipo de cambio", "cuenta bancaria", "pagar mis facturas",
+    ],
+    "Payment Agent": [
+        "pago", "payretailers", "transaccion", "checkout", "cobro", "reembolso", "devolucion",
+        "contracargo", "chargeback", "pasarela", "ecommerce", "pago rechazado", "metodo de pago",
+        "tienda online", "tarjeta rechazada",
+    ],
+    "Climate Agent": [
+        "clima", "temperatura", "lluvia", "calor$", "sequia", "inundac", "contamina", "huracan",
+        "cambio climatico", "calidad del aire", "ola de calor",
+    ],
+    "Energy Agent": [
+        "energ", "electric", "luz", "gas", "solar", "renovable", "kwh", "calefaccion", "placas solares",
+        "factura de la luz", "eficiencia energetica",
+    ],
+}
+
+LEXICON_WEIGHT = 1.0
+PHRASE_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 0.5
+WHOLE_WORD_MARKER = "$"
+
+# Added to the runner-up score so a single weak match never reaches full confidence
+CONFIDENCE_PRIOR = 0.5
+
+# Stems shorter than this only match whole words ("ley" must not match "leyenda")
+MIN_PREFIX_LENGTH = 4
+
+# Words of handoff descriptions that say nothing about the domain
+DESCRIPTION_STOPWORDS = {
+    "provides", "assistance", "assists", "related", "topics", "information", "other", "using",
+    "searches", "search", "specific", "questions", "mentions", "something", "performs", "accesses",
+    "should", "about", "their", "which", "where", "with", "only", "user's", "users", "user",
+}
+
+WORD_PATTERN = re.compile(r"\w+")
+
+ROUTE_LABELS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "route_labels.jsonl")
+
+
+def fold(text: str) -> str:
+    """
+    Lowercase and strip accents, so "Médico" and "medico" are the same word.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> list:
+    return WORD_PATTERN.findall(fold(text))
+
+
+class PreRouter:
+    """
+    Scores messages against every agent's vocabulary and keeps hit rate and accuracy counters.
+    """
+
+    def __init__(self, agents: list, threshold: float = PRE_ROUTER_THRESHOLD, lexicon: dict = DOMAIN_LEXICON, min_score: float = PRE_ROUTER_MIN_SCORE):
+        """
+        Parameters:
+        - agents: Specialist agents the supervisor can hand off to
+        - threshold: Confidence needed to route a message directly
+        - lexicon: Agent name -> stems and phrases of its domain
+        - min_score: Lexicon evidence needed to route a message directly
+        """
+        self.threshold = threshold
+        self.min_score = min_score
+        self.agents = {agent.name: agent for agent in agents if agent.name not in PRE_ROUTER_EXCLUDE}
+        self._stems = {}  # stem -> [(agent name, weight)]
+        self._whole_words = set()  # Stems that only match the whole word
+        self._phrases = []  # (" phrase", agent name)
+        for name, agent in self.agents.items():
+            for entry in lexicon.get(name, []):
+                entry = fold(entry)
+                if " " in entry:
+                    self._phrases.append((" " + entry, name))
+                    continue
+                if entry.endswith(WHOLE_WORD_MARKER):
+                    entry = entry[:-len(WHOLE_WORD_MARKER)]
+                    self._whole_words.add(entry)
+                self._stems.setdefault(entry, []).append((name, LEXICON_WEIGHT))
+            for word in set(tokenize(agent.handoff_description or "")):
+                if len(word) >= 5 and word not in DESCRIPTION_STOPWORDS:
+                    self._stems.setdefault(word, []).append((name, DESCRIPTION_WEIGHT))
+
+        self._lock = threading.Lock()
+        self.messages = 0
+        self.routed = 0
+        self.routed_by_agent = {}
+        self.weak_matches = 0  # Clear winner, but too little evidence to skip the supervisor
+        self.audited = 0
+        self.agreed = 0
+        self.disagreements = {}  # "routed -> supervisor" -> count
+
+    def _lookup(self, word: str) -> list:
+        matches = []
+        if word in self._stems:
+            matches.append(word)
+        for length in range(len(word) - 1, MIN_PREFIX_LENGTH - 1, -1):
+            if word[:length] in self._stems and word[:length] not in self._whole_words:
+                matches.append(word[:length])
+        return matches
+
+    def score(self, text: str) -> dict:
+        """
+        Return the score of every agent with at least one match in the text.
+        """
+        words = tokenize(text)
+        matched = set()
+        scores = {}
+        for word in words:
+            # A word counts once per agent, through its strongest stem ("visado" is not also "visa")
+            best = {}  # agent name -> (weight, stem)
+            for stem in self._lookup(word):
+                for name, weight in self._stems[stem]:
+                    if weight > best.get(name, (0.0, None))[0]:
+                        best[name] = (weight, stem)
+            for name, (weight, stem) in best.items():
+                if (stem, name) not in matched:
+                    matched.add((stem, name))
+                    scores[name] = scores.get(name, 0.0) + weight
+        joined = " " + " ".join(words)
+        for phrase, name in self._phrases:
+            if phrase in joined:
+                scores[name] = scores.get(name, 0.0) + PHRASE_WEIGHT
+        return scores
+
+    def classify(self, text: str) -> tuple:
+        """
+        Pick the best agent for a message.
+
+        Returns:
+        - (agent name or None, confidence between 0 and 1, score of that agent)
+        """
+        ranked = sorted(self.score(text).items(), key=lambda item: item[1], reverse=True)
+        if not ranked:
+            return None, 0.0, 0.0
+        best_name, best_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        return best_name, best_score / (best_score + runner_up + CONFIDENCE_PRIOR), best_score
+
+    def route(self, text: str):
+        """
+        Return the agent to run directly, or None if the supervisor should decide.
+        """
+        name, confidence, score = self.classify(text)
+        clear = name is not None and confidence >= self.threshold
+        routed = clear and score >= self.min_score
+        with self._lock:
+            self.messages += 1
+            self.weak_matches += clear and not routed
+            if routed:
+                self.routed += 1
+                self.routed_by_agent[name] = self.routed_by_agent.get(name, 0) + 1
+        if not routed:
+            return None
+        print(f"Pre-router sent the message to {name} (confidence {confidence:.2f})")
+        return self.agents[name]
+
+    def record_audit(self, routed_name: str, supervisor_name: str):
+        """
+        Record which agent the supervisor picked for a message the router had routed.
+        """
+        with self._lock:
+            self.audited += 1
+            if routed_name == supervisor_name:
+                self.agreed += 1
+            else:
+                key = f"{routed_name} -> {supervisor_name}"
+                self.disagreements[key] = self.disagreements.get(key, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": PRE_ROUTER_ENABLED,
+                "threshold": self.threshold,
+                "min_score": self.min_score,
+                "messages": self.messages,
+                "routed": self.routed,
+                "hit_rate": round(self.routed / self.messages, 3) if self.messages else 0.0,
+                "routed_by_agent": dict(self.routed_by_agent),
+                "weak_matches": self.weak_matches,
+                "audited": self.audited,
+                "accuracy": round(self.agreed / self.audited, 3) if self.audited else None,
+                "disagreements": dict(self.disagreements),
+            }
+
+
+def load_specialist_agents() -> list:
+    """
+    Import the agent instances of the our_agents package, as the supervisor gets them.
+    """
+    import importlib
+
+    folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "our_agents")
+    modules = (importlib.import_module(f"our_agents.{name[:-3]}") for name in sorted(os.listdir(folder)) if name.endswith("_agent.py"))
+    return [module.agent_instance for module in modules if getattr(module, "agent_instance", None)]
+
+
+def _main(args) -> int:
+    router = PreRouter(load_specialist_agents())
+    with open(args.labels, "r", encoding="utf-8") as file:
+        examples = [json.loads(line) for line in file if line.strip()]
+    failures = 0
+    for example in examples:
+        # "agent" is the specialist the message must go to, or null when the supervisor must decide
+        agent = router.route(example["message"])
+        routed_name = agent.name if agent is not None else None
+        if routed_name != example["agent"]:
+            failures += 1
+            name, confidence, score = router.classify(example["message"])
+            print(f"wrong route: {example['message']} -> {routed_name}, expected {example['agent']} (best {name}, confidence {confidence:.2f}, score {score:g})")
+    print(f"Messages: {len(examples)}, routed: {router.routed}, wrong routes: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the pre-router against labelled messages.")
+    parser.add_argument("--labels", default=ROUTE_LABELS_FILE, help="JSONL file with message and agent (null for the supervisor)")
+    sys.exit(_main(parser.parse_args()))
@@ -0,0 +1,160 @@
+import json
+import os
+import sqlite3
+import threading
+
+from utils.ttl_cache import TTLCache
+
+# SQLite database holding one row per user profile
+PROFILE_DB_FILE = os.getenv(
+    "PROFILE_DB_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "user_profiles.db"),
+)
+
+# Seconds between write-behind flushes, profile changes made in between are batched together
+PROFILE_FLUSH_INTERVAL = float(os.getenv("PROFILE_FLUSH_INTERVAL", "0.5"))
+
+# Profiles kept in the in-memory read cache
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+
+# Seconds a cached profile is trusted before it is read from the database again
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "3600"))
+
+
+class ProfileStore:
+    """
+    Per-user profile store backed by SQLite in WAL mode.
+
+    Reads go through an in-memory LRU cache. Writes update the cache immediately and are
+    flushed to the database by a background thread in batches, so a conversation turn only
+    touches its own user's record and never blocks on disk.
+    """
+
+    def __init__(self, db_path: str = PROFILE_DB_FILE, legacy_json_path: str = None):
+        """
+        Parameters:
+        - db_path: SQLite database file
+        - legacy_json_path: Optional user_data.json imported once if the database is empty
+        """
+        self._connection = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS profiles (user_id TEXT PRIMARY KEY, data TEXT NOT NULL)"
+        )
+        self._db_lock = threading.Lock()
+        self._cache = TTLCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL)
+        self._dirty = {}  # user_id -> profile waiting to be flushed
+        self._dirty_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.flushes = 0
+        self.rows_written = 0
+
+        if legacy_json_path:
+            self._import_legacy_json(legacy_json_path)
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="profile-store-flusher", daemon=True)
+        self._flusher.start()
+
+    def _import_legacy_json(self, path: str):
+        with self._db_lock:
+            if self._connection.execute("SELECT 1 FROM profiles LIMIT 1").fetchone():
+                return
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                profiles = json.load(file) or {}
+        except (OSError, json.JSONDecodeError):
+            return
+        with self._db_lock:
+            self._connection.execute("BEGIN")
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO profiles (user_id, data) VALUES (?, ?)",
+                [(user_id, json.dumps(profile, ensure_ascii=False)) for user_id, profile in profiles.items()],
+            )
+            self._connection.execute("COMMIT")
+        print(f"Imported {len(profiles)} user profiles from {path}")
+
+    def get(self, user_id: str) -> dict:
+        """
+        Return a copy of the user's profile, or an empty dict if the user is unknown.
+        """
+        with self._dirty_lock:
+            profile = self._dirty.get(user_id)
+        if profile is None:
+            profile = self._cache.get(user_id)
+        if profile is None:
+            with self._db_lock:
+                row = self._connection.execute(
+                    "SELECT data FROM profiles WHERE user_id = ?", (user_id,)
+                ).fetchone()
+            profile = json.loads(row[0]) if row else {}
+            self._cache.set(user_id, profile)
+        return dict(profile)
+
+    def update(self, user_id: str, changes: dict) -> dict:
+        """
+        Merge changes into the user's profile. The write reaches the database on the next flush.
+
+        Returns:
+        - The updated profile
+        """
+        profile = self.get(user_id)
+        profile.update(changes)
+        self._cache.set(user_id, profile)
+        with self._dirty_lock:
+            self._dirty[user_id] = profile
+        return dict(profile)
+
+    def flush(self):
+        """
+        Write every pending profile change in a single transaction.
+        """
+        with self._dirty_lock:
+            batch, self._dirty = self._dirty, {}
+        if not batch:
+            return
+        try:
+            with self._db_lock:
+                self._connection.execute("BEGIN")
+                self._connection.executemany(
+                    "INSERT INTO profiles (user_id, data) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data",
+                    [(user_id, json.dumps(profile, ensure_ascii=False)) for user_id, profile in batch.items()],
+                )
+                self._connection.execute("COMMIT")
+        except sqlite3.Error as e:
+            print(f"Error saving user profiles: {e}")
+            with self._db_lock:
+                if self._connection.in_transaction:
+                    self._connection.execute("ROLLBACK")
+            # Put the batch back unless a newer change for the same user arrived meanwhile
+            with self._dirty_lock:
+                for user_id, profile in batch.items():
+                    self._dirty.setdefault(user_id, profile)
+            return
+        self.flushes += 1
+        self.rows_written += len(batch)
+
+    def _flush_loop(self):
+        while not self._stop.wait(PROFILE_FLUSH_INTERVAL):
+            self.flush()
+
+    def close(self):
+        """
+        Stop the background flusher and write any pending changes.
+        """
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._flusher.join()
+        self.flush()
+        with self._db_lock:
+            self._connection.close()
+
+    def stats(self) -> dict:
+        return {
+            "cache": self._cache.stats(),
+            "pending_writes": len(self._dirty),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+        }
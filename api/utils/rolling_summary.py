@@ -0,0 +1,108 @@
+import html
+import os
+import re
+
+# Maximum size in tokens of a user's rolling conversation summary
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "400"))
+
+# Most recent turns kept verbatim next to the summary, older turns are folded into it
+SUMMARY_RECENT_TURNS = int(os.getenv("SUMMARY_RECENT_TURNS", "4"))
+
+# Rough characters per token for Spanish and English text, good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+TAG_PATTERN = re.compile(r"<(script|style)\b.*?</\1>|<[^>]+>", re.DOTALL | re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def html_to_text(markup: str) -> str:
+    """
+    Strip tags from an HTML answer so only its readable text is kept in the history.
+    """
+    return " ".join(html.unescape(TAG_PATTERN.sub(" ", markup)).split())
+
+
+def truncate_to_budget(text: str, token_budget: int = SUMMARY_TOKEN_BUDGET) -> str:
+    """
+    Cut the text at the last sentence or word boundary that fits the token budget.
+    """
+    max_chars = token_budget * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    boundary = max(cut.rfind(". "), cut.rfind("\n"))
+    if boundary < max_chars // 2:
+        boundary = cut.rfind(" ")
+    return cut[:boundary + 1].rstrip() if boundary > 0 else cut
+
+
+def format_turns(turns) -> str:
+    return "".join(f"{turn.role.capitalize()}: {turn.content}\n\n" for turn in turns)
+
+
+class ConversationSummarizer:
+    """
+    Keeps a bounded running summary of a conversation.
+
+    Each update folds a few old turns into the previous summary with one small LLM call, so
+    the final report reads the summary plus the last turns instead of the whole conversation.
+    """
+
+    def __init__(self, llm_client, llm_model_name: str, token_budget: int = SUMMARY_TOKEN_BUDGET):
+        """
+        Parameters:
+        - llm_client: Async OpenAI compatible client
+        - llm_model_name: Model or deployment used for the summaries
+        - token_budget: Maximum size of the summary in tokens
+        """
+        self.llm_client = llm_client
+        self.llm_model_name = llm_model_name
+        self.token_budget = token_budget
+        self.updates = 0
+        self.failures = 0
+
+    async def update(self, summary: str, turns) -> str:
+        """
+        Fold the given turns into the summary.
+
+        Parameters:
+        - summary: The current summary, empty for a new conversation
+        - turns: The turns to fold in, oldest first
+
+        Returns:
+        - The new summary, never longer than the token budget
+        """
+        prompt = f"""
+        Resumen actual de la conversación:
+        {summary or "(vacío)"}
+
+        Nuevos mensajes:
+        {format_turns(turns)}
+
+        Actualiza el resumen en español incorporando los nuevos mensajes. Conserva los problemas,
+        preocupaciones, objetivos y datos concretos que mencionó el usuario y las recomendaciones dadas.
+        Escribe solo el resumen, en como máximo {int(self.token_budget * 0.75)} palabras.
+        """
+        try:
+            completion = await self.llm_client.chat.completions.create(
+                model=self.llm_model_name,
+                messages=[{"role": "system", "content": prompt}],
+                max_tokens=self.token_budget,
+                temperature=0,
+            )
+            new_summary = (completion.choices[0].message.content or "").strip()
+        except Exception:
+            self.failures += 1
+            raise
+        self.updates += 1
+        return truncate_to_budget(new_summary, self.token_budget)
+
+    def stats(self) -> dict:
+        return {
+            "updates": self.updates,
+            "failures": self.failures,
+            "token_budget": self.token_budget,
+        }
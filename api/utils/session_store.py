@@ -0,0 +1,310 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+
+from utils.point_index import PointIndex
+
+# Seconds without activity after which a session is moved from memory to disk
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+
+# Maximum sessions kept in memory per worker, the least recently used ones are spilled to disk
+SESSION_MAX_IN_MEMORY = int(os.getenv("SESSION_MAX_IN_MEMORY", "2000"))
+
+# Maximum bytes of conversation text kept per session, the oldest turns are dropped past it
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", "262144"))
+
+# Directory for spilled sessions
+SESSION_SPILL_DIR = os.getenv("SESSION_SPILL_DIR", os.path.join(tempfile.gettempdir(), "payretailers_sessions"))
+
+# Seconds a spilled session is kept on disk before it is deleted for good
+SESSION_DISK_TTL = float(os.getenv("SESSION_DISK_TTL", "604800"))
+
+# Largest size of the spill directory in MB, the least recently used sessions are deleted past it
+SESSION_SPILL_MAX_MB = float(os.getenv("SESSION_SPILL_MAX_MB", "512"))
+
+# Share of the size cap a sweep trims the spill directory down to, so one sweep makes room for many spills
+DISK_SWEEP_TARGET = 0.9
+
+# Seconds between sweeps for idle sessions and expired spill files
+SESSION_SWEEP_INTERVAL = 30
+DISK_SWEEP_INTERVAL = 3600
+
+
+class Turn:
+    """
+    A single conversation message. Slotted so long histories stay small.
+    """
+
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+
+
+class Session:
+    """
+    Conversation state for one user.
+    """
+
+    __slots__ = ("user_id", "turns", "summary", "pain_points", "good_points", "last_access", "nbytes")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.turns = []
+        self.summary = ""  # Rolling summary of the turns already folded out of self.turns
+        self.pain_points = PointIndex()
+        self.good_points = PointIndex()
+        self.last_access = time.time()
+        self.nbytes = 0
+
+    def add_turn(self, role: str, content, max_bytes: int = SESSION_MAX_BYTES):
+        """
+        Append a message, dropping the oldest ones if the session grows past max_bytes.
+        Agent outputs are stored as their text only.
+        """
+        if not isinstance(content, str):
+            content = getattr(content, "data", None) or str(content)
+        self.turns.append(Turn(role, content))
+        self.nbytes += len(content.encode("utf-8"))
+        while self.nbytes > max_bytes and len(self.turns) > 1:
+            self.drop_turns(1)
+
+    def drop_turns(self, count: int):
+        """
+        Remove the oldest turns, e.g. once they have been folded into the summary.
+        """
+        for turn in self.turns[:count]:
+            self.nbytes -= len(turn.content.encode("utf-8"))
+        del self.turns[:count]
+
+    def is_empty(self) -> bool:
+        """
+        Tell a session nobody has talked in yet, which is not worth keeping on disk.
+        """
+        return not self.turns and not self.summary
+
+    def to_dict(self) -> dict:
+        return {
+            "user_id": self.user_id,
+            "turns": [[turn.role, turn.content] for turn in self.turns],
+            "summary": self.summary,
+            "pain_points": self.pain_points.to_list(),
+            "good_points": self.good_points.to_list(),
+            "last_access": self.last_access,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Session":
+        session = cls(data["user_id"])
+        for role, content in data.get("turns", []):
+            session.turns.append(Turn(role, content))
+            session.nbytes += len(content.encode("utf-8"))
+        session.summary = data.get("summary", "")
+        session.pain_points = PointIndex.from_list(data.get("pain_points"))
+        session.good_points = PointIndex.from_list(data.get("good_points"))
+        session.last_access = data.get("last_access", session.last_access)
+        return session
+
+
+class SessionStore:
+    """
+    Bounded in-memory session store.
+
+    Sessions idle for longer than the idle TTL, or pushed out of the LRU by newer ones, are spilled
+    to a JSON file and reloaded transparently the next time the user speaks. Empty sessions are
+    dropped instead of spilled. Spill files are deleted after the disk TTL, and the least recently
+    used ones as soon as the directory passes its size cap, so memory and disk per worker stay flat
+    however long the server runs.
+    """
+
+    def __init__(
+        self,
+        idle_ttl: float = SESSION_IDLE_TTL,
+        max_in_memory: int = SESSION_MAX_IN_MEMORY,
+        max_bytes: int = SESSION_MAX_BYTES,
+        spill_dir: str = SESSION_SPILL_DIR,
+        disk_ttl: float = SESSION_DISK_TTL,
+        spill_max_mb: float = SESSION_SPILL_MAX_MB,
+    ):
+        self.idle_ttl = idle_ttl
+        self.max_in_memory = max_in_memory
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.disk_ttl = disk_ttl
+        self.spill_max_bytes = int(spill_max_mb * 1024 * 1024)
+        self._sessions = OrderedDict()  # user_id -> Session, least recently used first
+        self._next_sweep = 0.0
+        self._next_disk_sweep = 0.0
+        self.spills = 0
+        self.reloads = 0
+        self.dropped_empty = 0
+        self.spill_bytes = 0  # Size of the spill directory, recounted by every disk sweep
+        self.spill_evictions = 0
+        os.makedirs(self.spill_dir, exist_ok=True)
+
+    def _spill_path(self, user_id: str) -> str:
+        digest = hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.spill_dir, f"{digest}.json")
+
+    def get(self, user_id: str) -> Session:
+        """
+        Return the user's session, reloading it from disk or creating it if needed.
+        """
+        session = self._sessions.get(user_id)
+        if session is None:
+            session = self._reload(user_id) or Session(user_id)
+            self._sessions[user_id] = session
+        else:
+            self._sessions.move_to_end(user_id)
+        session.last_access = time.time()
+        self._evict_overflow()
+        self._maybe_sweep()
+        return session
+
+    def pop(self, user_id: str):
+        """
+        Remove the user's session from memory and disk.
+
+        Returns:
+        - The removed session, or None if the user had none
+        """
+        session = self._sessions.pop(user_id, None)
+        if session is None:
+            session = self._reload(user_id)
+        else:
+            self._remove_spill(user_id)
+        return session
+
+    def add_turn(self, session: Session, role: str, content):
+        session.add_turn(role, content, self.max_bytes)
+
+    def _reload(self, user_id: str):
+        path = self._spill_path(user_id)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        self._remove_spill(user_id)
+        if data.get("user_id") != user_id or time.time() - data.get("last_access", 0) > self.disk_ttl:
+            return None
+        self.reloads += 1
+        return Session.from_dict(data)
+
+    def _remove_spill(self, user_id: str):
+        path = self._spill_path(user_id)
+        try:
+            size = os.path.getsize(path)
+            os.unlink(path)
+        except OSError:
+            return
+        self.spill_bytes -= size
+
+    def _spill(self, session: Session):
+        if session.is_empty():
+            # e.g. a user who only sent "start", or a client cycling through user ids
+            self.dropped_empty += 1
+            return
+        path = self._spill_path(session.user_id)
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(session.to_dict(), file, ensure_ascii=False)
+            size = os.path.getsize(temp_path)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(temp_path, path)
+            self.spills += 1
+        except OSError as e:
+            print(f"Error spilling session to disk: {e}")
+            return
+        self.spill_bytes += size - replaced
+        if self.spill_bytes > self.spill_max_bytes:
+            self._sweep_disk(time.time())
+
+    def _evict_overflow(self):
+        while len(self._sessions) > self.max_in_memory:
+            _, session = self._sessions.popitem(last=False)
+            self._spill(session)
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if now >= self._next_sweep:
+            self._next_sweep = now + SESSION_SWEEP_INTERVAL
+            # Sessions are kept in access order, so idle ones sit at the front
+            while self._sessions:
+                user_id, session = next(iter(self._sessions.items()))
+                if now - session.last_access < self.idle_ttl:
+                    break
+                del self._sessions[user_id]
+                self._spill(session)
+
+        if now >= self._next_disk_sweep:
+            self._sweep_disk(now)
+
+    def _sweep_disk(self, now: float):
+        """
+        Delete expired spill files, then the least recently used ones until the directory is back under its target size.
+        """
+        self._next_disk_sweep = now + DISK_SWEEP_INTERVAL
+        kept = []  # (modified at, size, path)
+        total = 0
+        try:
+            with os.scandir(self.spill_dir) as entries:
+                for entry in entries:
+                    try:
+                        info = entry.stat()
+                        if now - info.st_mtime > self.disk_ttl:
+                            os.unlink(entry.path)
+                            continue
+                    except OSError:
+                        continue
+                    kept.append((info.st_mtime, info.st_size, entry.path))
+                    total += info.st_size
+        except OSError as e:
+            print(f"Error cleaning spilled sessions: {e}")
+            return
+        if total > self.spill_max_bytes:
+            # A spill file is written when its session leaves memory, so the oldest belong to the longest idle users
+            kept.sort()
+            target = self.spill_max_bytes * DISK_SWEEP_TARGET
+            evicted = 0
+            for _, size, path in kept:
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                total -= size
+                evicted += 1
+            self.spill_evictions += evicted
+            print(f"Spill directory over {self.spill_max_bytes / (1024 * 1024):g} MB, deleted {evicted} least recently used sessions")
+        self.spill_bytes = total
+
+    def close(self):
+        """
+        Spill every in-memory session so conversations survive a restart.
+        """
+        while self._sessions:
+            _, session = self._sessions.popitem(last=False)
+            self._spill(session)
+
+    def stats(self) -> dict:
+        return {
+            "in_memory": len(self._sessions),
+            "max_in_memory": self.max_in_memory,
+            "bytes_in_memory": sum(session.nbytes for session in self._sessions.values()),
+            "spills": self.spills,
+            "reloads": self.reloads,
+            "dropped_empty": self.dropped_empty,
+            "spill_bytes": self.spill_bytes,
+            "spill_max_bytes": self.spill_max_bytes,
+            "spill_evictions": self.spill_evictions,
+        }
@@ -0,0 +1,207 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+
+# Number of transcription workers, each one holds its own copy of the Whisper model
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", "2"))
+
+# "process" runs inference in separate processes (one model and one core each, no GIL contention),
+# "thread" keeps the workers in this process, which is lighter but shares the GIL
+WHISPER_EXECUTOR = os.getenv("WHISPER_EXECUTOR", "process").lower()
+
+# Clips allowed to wait for a free worker, further requests are rejected right away
+WHISPER_QUEUE_SIZE = int(os.getenv("WHISPER_QUEUE_SIZE", "8"))
+
+# Seconds a caller waits for its transcription before giving up
+WHISPER_JOB_TIMEOUT = float(os.getenv("WHISPER_JOB_TIMEOUT", "120"))
+
+# Seconds the workers of a new pool get to start and load the model
+WHISPER_WARM_UP_TIMEOUT = float(os.getenv("WHISPER_WARM_UP_TIMEOUT", "600"))
+
+
+class TranscriptionBusyError(Exception):
+    """
+    Raised when every worker is busy and the queue is full.
+    """
+
+
+class TranscriptionTimeoutError(Exception):
+    """
+    Raised when a transcription takes longer than the job timeout.
+    """
+
+
+# Worker side. In process mode these globals live in each worker process, in thread mode the
+# model is kept per thread so concurrent jobs never share one model instance.
+_worker_state = threading.local()
+
+
+def _init_worker(model_name: str, warm_up_barrier):
+    import whisper
+
+    _worker_state.model = whisper.load_model(model_name)
+    _worker_state.warm_up_barrier = warm_up_barrier
+    print(f"Transcription worker {os.getpid()} loaded Whisper model '{model_name}'")
+
+
+def _warm_worker(timeout: float) -> tuple:
+    # Runs after the initializer, so by now this worker has its model. Holding the worker at the
+    # barrier until every warm-up job is running keeps it from taking a second one, so the pool
+    # has to start all of its workers (and load the model in each) before warm-up returns.
+    _worker_state.warm_up_barrier.wait(timeout)
+    return os.getpid(), threading.get_ident()
+
+
+def _transcribe_in_worker(audio_path: str, options: dict) -> str:
+    result = _worker_state.model.transcribe(audio_path, **options)
+    return result.get("text", "")
+
+
+class TranscriptionPool:
+    """
+    Runs local Whisper inference off the event loop.
+
+    Jobs go to a pool of workers that each load the model once at start. At most
+    workers + queue_size jobs are accepted at a time and each caller waits at most the job timeout,
+    so a burst of long clips degrades into fast 503s instead of an unresponsive server.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        workers: int = WHISPER_WORKERS,
+        executor: str = WHISPER_EXECUTOR,
+        queue_size: int = WHISPER_QUEUE_SIZE,
+        job_timeout: float = WHISPER_JOB_TIMEOUT,
+    ):
+        self.model_name = model_name
+        self.workers = workers
+        self.executor_kind = executor
+        self.job_timeout = job_timeout
+        self.capacity = workers + queue_size
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._executor = self._create_executor(model_name)
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_seconds = 0.0
+
+    def _create_executor(self, model_name: str):
+        if self.executor_kind == "thread":
+            self._warm_up_barrier = threading.Barrier(self.workers)
+            return ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="whisper",
+                initializer=_init_worker,
+                initargs=(model_name, self._warm_up_barrier),
+            )
+        # Spawned workers do not inherit the server's event loop, sockets or threads
+        context = multiprocessing.get_context("spawn")
+        self._warm_up_barrier = context.Barrier(self.workers)
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(model_name, self._warm_up_barrier),
+        )
+
+    def reload(self, model_name: str):
+        """
+        Switch to another model. Jobs already running finish on the old workers.
+        """
+        old_executor = self._executor
+        self._executor = self._create_executor(model_name)
+        self.model_name = model_name
+        old_executor.shutdown(wait=False)
+
+    async def warm_up(self, timeout: float = WHISPER_WARM_UP_TIMEOUT):
+        """
+        Start every worker and wait until they have loaded the model.
+
+        Raises:
+        - TranscriptionTimeoutError if the workers were not all up within the timeout
+        """
+        futures = [self._executor.submit(_warm_worker, timeout) for _ in range(self.workers)]
+        try:
+            workers = await asyncio.wait_for(asyncio.gather(*[asyncio.wrap_future(future) for future in futures]), timeout)
+        except (asyncio.TimeoutError, threading.BrokenBarrierError):
+            self._warm_up_barrier.abort()  # Release the workers still waiting
+            raise TranscriptionTimeoutError(f"Transcription workers did not load '{self.model_name}' within {timeout:g}s")
+        except BaseException:
+            self._warm_up_barrier.abort()
+            raise
+        print(f"{len(set(workers))} transcription workers ready with Whisper model '{self.model_name}'")
+
+    async def transcribe(self, audio_path: str, **options) -> str:
+        """
+        Transcribe an audio file on a worker.
+
+        Parameters:
+        - audio_path: Path of the audio file, readable by the workers
+        - options: Extra arguments for whisper's transcribe (language, fp16, ...)
+
+        Returns:
+        - The transcribed text
+
+        Raises:
+        - TranscriptionBusyError if the queue is full
+        - TranscriptionTimeoutError if the job took longer than the timeout
+        """
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                raise TranscriptionBusyError("Too many transcriptions in progress, try again later")
+            self.in_flight += 1
+
+        started = time.perf_counter()
+        try:
+            try:
+                future = self._executor.submit(_transcribe_in_worker, audio_path, options)
+            except BrokenExecutor:
+                # A worker died (e.g. out of memory), start a fresh pool instead of failing forever
+                print("Transcription pool is broken, restarting workers")
+                self.reload(self.model_name)
+                future = self._executor.submit(_transcribe_in_worker, audio_path, options)
+        except BaseException:
+            self._release(None)
+            raise
+        # The slot is freed when the worker is done, not when the caller stops waiting,
+        # so timed out jobs still count against the queue until they really finish
+        future.add_done_callback(self._release)
+        try:
+            text = await asyncio.wait_for(asyncio.wrap_future(future), self.job_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise TranscriptionTimeoutError(f"Transcription took longer than {self.job_timeout:g}s")
+        except Exception:
+            self.failed += 1
+            raise
+        self.completed += 1
+        self.total_seconds += time.perf_counter() - started
+        return text
+
+    def _release(self, future):
+        with self._lock:
+            self.in_flight -= 1
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "executor": self.executor_kind,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "capacity": self.capacity,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_seconds": round(self.total_seconds / self.completed, 2) if self.completed else 0.0,
+        }
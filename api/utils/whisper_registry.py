@@ -0,0 +1,161 @@
+import asyncio
+import os
+from collections import OrderedDict
+
+from utils.transcription_pool import TranscriptionPool, TranscriptionBusyError, WHISPER_WORKERS
+
+# Total memory in MB that resident Whisper models may take across all their workers
+WHISPER_MEMORY_BUDGET_MB = float(os.getenv("WHISPER_MEMORY_BUDGET_MB", "4096"))
+
+# Models behind the speed tiers a request can ask for, as "tier=model" pairs
+WHISPER_TIERS = dict(
+    pair.split("=", 1)
+    for pair in os.getenv("WHISPER_TIERS", "fast=base,accurate=small").split(",")
+    if "=" in pair
+)
+
+# Approximate resident memory in MB of one worker holding each model (fp32 weights plus runtime)
+MODEL_MEMORY_MB = {
+    "tiny": 300,
+    "base": 450,
+    "small": 1200,
+    "medium": 3200,
+    "turbo": 3300,
+    "large": 6200,
+}
+DEFAULT_MODEL_MEMORY_MB = 3200
+
+
+def estimate_model_memory(model_name: str, workers: int = WHISPER_WORKERS) -> float:
+    # "base.en", "large-v3" and similar variants weigh the same as their family
+    family = model_name.split(".")[0].split("-")[0]
+    return MODEL_MEMORY_MB.get(family, DEFAULT_MODEL_MEMORY_MB) * workers
+
+
+class WhisperModelRegistry:
+    """
+    Keeps one transcription pool per resident Whisper model.
+
+    Models are loaded in the background and only used once every worker has them in memory, so
+    switching the default model never stalls requests: they keep using the previous model until
+    the new one is ready. Pools that do not fit the memory budget are evicted least recently used
+    first, never the default one or one with jobs in flight.
+    """
+
+    def __init__(self, default_model: str, tiers: dict = WHISPER_TIERS, memory_budget_mb: float = WHISPER_MEMORY_BUDGET_MB):
+        self.default_model = default_model
+        self.tiers = tiers
+        self.memory_budget_mb = memory_budget_mb
+        self._pools = OrderedDict()  # model -> ready TranscriptionPool, least recently used first
+        self._loading = {}  # model -> task loading it
+        self._requested_default = default_model
+        self.evictions = 0
+        self.load_failures = 0
+
+    def resolve(self, tier: str = None) -> str:
+        """
+        Return the model for a tier ("fast", "accurate", ...), or the default model.
+        """
+        return self.tiers.get((tier or "").lower(), self.default_model)
+
+    def pool_for(self, tier: str = None) -> TranscriptionPool:
+        """
+        Return a ready pool for the tier. If its model is not loaded yet, loading starts in the
+        background and the default model (or any ready one) answers meanwhile.
+
+        Raises:
+        - TranscriptionBusyError if no model has finished loading yet
+        """
+        model_name = self.resolve(tier)
+        pool = self._pools.get(model_name)
+        if pool is not None:
+            self._pools.move_to_end(model_name)
+            return pool
+
+        self.load(model_name)
+        pool = self._pools.get(self.default_model)
+        if pool is None and self._pools:
+            pool = next(reversed(self._pools.values()))
+        if pool is None:
+            raise TranscriptionBusyError("The Whisper model is still loading, try again shortly")
+        return pool
+
+    async def transcribe(self, audio_path: str, tier: str = None, **options) -> str:
+        return await self.pool_for(tier).transcribe(audio_path, **options)
+
+    def load(self, model_name: str) -> asyncio.Task:
+        """
+        Start loading a model in the background unless it is resident or already loading.
+        """
+        task = self._loading.get(model_name)
+        if task is None and model_name not in self._pools:
+            task = asyncio.create_task(self._load(model_name))
+            self._loading[model_name] = task
+            task.add_done_callback(lambda finished_task: self._loading.pop(model_name, None))
+        return task
+
+    def set_default(self, model_name: str):
+        """
+        Make model_name the default once it is loaded. Until then the current default keeps serving.
+        """
+        self._requested_default = model_name
+        if model_name in self._pools:
+            self.default_model = model_name
+        else:
+            self.load(model_name)
+
+    async def _load(self, model_name: str):
+        self._make_room(estimate_model_memory(model_name))
+        print(f"Loading Whisper model '{model_name}' in the background")
+        pool = TranscriptionPool(model_name)
+        try:
+            await pool.warm_up()
+        except asyncio.CancelledError:
+            pool.close()
+            raise
+        except Exception as e:
+            self.load_failures += 1
+            print(f"Error loading Whisper model '{model_name}': {e}")
+            pool.close()
+            return
+        self._pools[model_name] = pool
+        if model_name == self._requested_default:
+            # Atomic swap: new requests go to the new model from here on, and the old default
+            # becomes evictable if the budget is tight
+            self.default_model = model_name
+            self._make_room(0)
+        print(f"Whisper model '{model_name}' ready")
+
+    def _resident_memory(self) -> float:
+        return sum(estimate_model_memory(name, pool.workers) for name, pool in self._pools.items())
+
+    def _make_room(self, needed_mb: float):
+        for model_name in list(self._pools):
+            if self._resident_memory() + needed_mb <= self.memory_budget_mb:
+                return
+            pool = self._pools[model_name]
+            if model_name in (self.default_model, self._requested_default) or pool.in_flight:
+                continue
+            del self._pools[model_name]
+            pool.close()
+            self.evictions += 1
+            print(f"Evicted Whisper model '{model_name}' to stay within the memory budget")
+
+    def close(self):
+        for task in self._loading.values():
+            task.cancel()
+        for pool in self._pools.values():
+            pool.close()
+        self._pools.clear()
+
+    def stats(self) -> dict:
+        return {
+            "default_model": self.default_model,
+            "tiers": self.tiers,
+            "loading": list(self._loading),
+            "memory_budget_mb": self.memory_budget_mb,
+            "estimated_memory_mb": self._resident_memory(),
+            "evictions": self.evictions,
+            "load_failures": self.load_failures,
+            "pools": {name: pool.stats() for name, pool in self._pools.items()},
+        }
@@ -0,0 +1,284 @@
+"""
+Local World Bank indicator store.
+
+A prefetch job bulk-downloads the indicators we use for the countries we serve and writes them
+as three files:
+
+- index.json: fetch time and, per "COUNTRY:INDICATOR" key, the offset and length of its series
+- years.bin: uint16 column with the year of every observation
+- values.bin: float64 column with the value of every observation (NaN when missing)
+
+Series are stored most recent year first. The binary columns are memory-mapped, so a lookup is a
+dict access plus a short scan over a few floats.
+
+Run the prefetch from the api directory:
+
+    python -m utils.worldbank_store                       # download from api.worldbank.org
+    python -m utils.worldbank_store --fixtures ./fixtures # read <INDICATOR>.json files instead
+
+Fixture files use the same JSON the API returns for a multi-country indicator query.
+"""
+import argparse
+import array
+import asyncio
+import json
+import math
+import mmap
+import os
+import threading
+import time
+
+from utils.http_client import http_get, close_http_client
+
+# Directory holding the prefetched store
+WORLDBANK_STORE_DIR = os.getenv(
+    "WORLDBANK_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "worldbank"),
+)
+
+# Days after which prefetched data is considered stale and the live API is used instead
+WORLDBANK_STORE_MAX_AGE_DAYS = float(os.getenv("WORLDBANK_STORE_MAX_AGE_DAYS", "30"))
+
+# Countries our users live in or move to (ISO 3166-1 alpha-3)
+PREFETCH_COUNTRIES = [
+    "ARG", "BOL", "BRA", "CHL", "COL", "CRI", "CUB", "DOM", "ECU", "SLV", "GTM",
+    "HND", "MEX", "NIC", "PAN", "PRY", "PER", "URY", "VEN", "ESP", "USA",
+]
+
+# ISO 3166-1 alpha-2 codes of the prefetched countries. The World Bank API accepts both forms and
+# the agents often pass alpha-2 ("CO", "ES"), while the store is keyed by alpha-3
+ISO2_TO_ISO3 = {
+    "AR": "ARG", "BO": "BOL", "BR": "BRA", "CL": "CHL", "CO": "COL", "CR": "CRI", "CU": "CUB",
+    "DO": "DOM", "EC": "ECU", "SV": "SLV", "GT": "GTM", "HN": "HND", "MX": "MEX", "NI": "NIC",
+    "PA": "PAN", "PY": "PRY", "PE": "PER", "UY": "URY", "VE": "VEN", "ES": "ESP", "US": "USA",
+}
+
+# Indicators the Money Agent asks for
+PREFETCH_INDICATORS = [
+    "NY.GDP.MKTP.CD",     # GDP (current US$)
+    "NY.GDP.PCAP.CD",     # GDP per capita (current US$)
+    "NY.GDP.MKTP.KD.ZG",  # GDP growth (annual %)
+    "NY.GNP.PCAP.CD",     # GNI per capita, Atlas method (current US$)
+    "FP.CPI.TOTL.ZG",     # Inflation, consumer prices (annual %)
+    "FP.CPI.TOTL",        # Consumer price index (2010 = 100)
+    "PA.NUS.FCRF",        # Official exchange rate (LCU per US$)
+    "FR.INR.LEND",        # Lending interest rate (%)
+    "FR.INR.DPST",        # Deposit interest rate (%)
+    "SL.UEM.TOTL.ZS",     # Unemployment, total (% of labor force)
+    "SL.UEM.1524.ZS",     # Unemployment, youth (% of labor force ages 15-24)
+    "SL.TLF.CACT.ZS",     # Labor force participation rate (%)
+    "SI.POV.GINI",        # Gini index
+    "SI.POV.DDAY",        # Poverty headcount ratio at $2.15 a day (%)
+    "SI.POV.NAHC",        # Poverty headcount ratio at national poverty lines (%)
+    "BX.TRF.PWKR.DT.GD.ZS",  # Personal remittances, received (% of GDP)
+    "BX.TRF.PWKR.CD.DT",  # Personal remittances, received (current US$)
+    "FS.AST.PRVT.GD.ZS",  # Domestic credit to private sector (% of GDP)
+    "FB.CBK.BRCH.P5",     # Commercial bank branches (per 100,000 adults)
+    "FX.OWN.TOTL.ZS",     # Account ownership at a financial institution (% age 15+)
+    "GC.DOD.TOTL.GD.ZS",  # Central government debt, total (% of GDP)
+    "GC.TAX.TOTL.GD.ZS",  # Tax revenue (% of GDP)
+    "NE.CON.PRVT.PC.KD",  # Households final consumption per capita (constant US$)
+    "SP.POP.TOTL",        # Population, total
+    "SP.URB.TOTL.IN.ZS",  # Urban population (% of total)
+    "SP.DYN.LE00.IN",     # Life expectancy at birth (years)
+    "SH.XPD.CHEX.PC.CD",  # Current health expenditure per capita (current US$)
+    "SE.XPD.TOTL.GD.ZS",  # Government expenditure on education (% of GDP)
+    "EG.ELC.ACCS.ZS",     # Access to electricity (% of population)
+    "IT.NET.USER.ZS",     # Individuals using the Internet (% of population)
+]
+
+# First year downloaded by the prefetch job
+PREFETCH_FIRST_YEAR = 2000
+
+INDEX_FILE = "index.json"
+YEARS_FILE = "years.bin"
+VALUES_FILE = "values.bin"
+
+# Seconds between checks for a newer prefetch on disk
+RELOAD_CHECK_INTERVAL = 60
+
+
+def normalize_country_code(country_code: str) -> str:
+    """
+    Return the alpha-3 code the store is keyed by, for an alpha-2 or alpha-3 code in any case.
+    """
+    code = (country_code or "").strip().upper()
+    return ISO2_TO_ISO3.get(code, code)
+
+
+class WorldBankStore:
+    """
+    Read side of the store: memory-maps the columns and answers lookups in-process.
+    """
+
+    def __init__(self, store_dir: str = WORLDBANK_STORE_DIR, max_age_days: float = WORLDBANK_STORE_MAX_AGE_DAYS):
+        self.store_dir = store_dir
+        self.max_age_seconds = max_age_days * 86400
+        self.series = {}
+        self.fetched_at = 0.0
+        self.years = None
+        self.values = None
+        self._index_mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            self._next_check = now + RELOAD_CHECK_INTERVAL
+            index_path = os.path.join(self.store_dir, INDEX_FILE)
+            try:
+                mtime = os.stat(index_path).st_mtime
+            except OSError:
+                return
+            if mtime == self._index_mtime:
+                return
+            try:
+                with open(index_path, "r", encoding="utf-8") as file:
+                    index = json.load(file)
+                years = _map_column(os.path.join(self.store_dir, YEARS_FILE), "H")
+                values = _map_column(os.path.join(self.store_dir, VALUES_FILE), "d")
+            except (OSError, ValueError) as e:
+                print(f"Error loading World Bank store: {e}")
+                return
+            self.series = index["series"]
+            self.fetched_at = index["fetched_at"]
+            self.years, self.values = years, values
+            self._index_mtime = mtime
+            print(f"Loaded World Bank store with {len(self.series)} series.")
+
+    def lookup(self, country_code: str, indicator: str):
+        """
+        Return the most recent non-missing observation for the series.
+
+        Returns:
+        - (year, value), or None if the series is not in the store or the store is stale
+        """
+        self._maybe_reload()
+        location = self.series.get(f"{normalize_country_code(country_code)}:{indicator.strip().upper()}")
+        if location is None or time.time() - self.fetched_at > self.max_age_seconds:
+            self.misses += 1
+            return None
+        offset, length = location
+        values, years = self.values, self.years
+        for position in range(offset, offset + length):
+            value = values[position]
+            if not math.isnan(value):
+                self.hits += 1
+                return years[position], value
+        self.misses += 1
+        return None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "series": len(self.series),
+            "fetched_at": self.fetched_at or None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _map_column(path: str, typecode: str) -> memoryview:
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return memoryview(array.array(typecode))
+        # The mapping stays valid after the file is closed or replaced by a newer prefetch
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapped).cast(typecode)
+
+
+async def _fetch_indicator(indicator: str, fixtures_dir: str = None) -> list:
+    """
+    Return the observation rows for one indicator across all prefetched countries.
+    """
+    if fixtures_dir:
+        with open(os.path.join(fixtures_dir, f"{indicator}.json"), "r", encoding="utf-8") as file:
+            data = json.load(file)
+    else:
+        url = (
+            f"https://api.worldbank.org/v2/country/{';'.join(PREFETCH_COUNTRIES)}/indicator/{indicator}"
+            f"?format=json&per_page=20000&date={PREFETCH_FIRST_YEAR}:{time.gmtime().tm_year}"
+        )
+        response = await http_get(url, tool="worldbank_prefetch")
+        response.raise_for_status()
+        data = response.json()
+    return data[1] if len(data) > 1 and data[1] else []
+
+
+async def prefetch(store_dir: str = WORLDBANK_STORE_DIR, fixtures_dir: str = None):
+    """
+    Download every prefetched indicator and write a fresh store to store_dir.
+    Indicators that fail to download are skipped and reported.
+    """
+    results = await asyncio.gather(
+        *[_fetch_indicator(indicator, fixtures_dir) for indicator in PREFETCH_INDICATORS],
+        return_exceptions=True,
+    )
+
+    # (country, indicator) -> {year: value}
+    observations = {}
+    for indicator, rows in zip(PREFETCH_INDICATORS, results):
+        if isinstance(rows, BaseException):
+            print(f"Skipping {indicator}: {rows}")
+            continue
+        for row in rows:
+            country = row.get("countryiso3code") or row.get("country", {}).get("id")
+            try:
+                year = int(row["date"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if not country:
+                continue
+            value = row.get("value")
+            # Rows without countryiso3code fall back to the alpha-2 country id
+            observations.setdefault((normalize_country_code(country), indicator.upper()), {})[year] = (
+                float(value) if value is not None else math.nan
+            )
+
+    years = array.array("H")
+    values = array.array("d")
+    series = {}
+    for (country, indicator), by_year in sorted(observations.items()):
+        series[f"{country}:{indicator}"] = [len(values), len(by_year)]
+        for year in sorted(by_year, reverse=True):
+            years.append(year)
+            values.append(by_year[year])
+
+    os.makedirs(store_dir, exist_ok=True)
+    # Columns first and the index last, so readers never see an index pointing past the columns
+    _write_atomic(os.path.join(store_dir, YEARS_FILE), years.tobytes())
+    _write_atomic(os.path.join(store_dir, VALUES_FILE), values.tobytes())
+    index = {"fetched_at": time.time(), "series": series}
+    _write_atomic(os.path.join(store_dir, INDEX_FILE), json.dumps(index).encode("utf-8"))
+    print(f"Wrote {len(series)} series ({len(values)} observations) to {store_dir}")
+
+
+def _write_atomic(path: str, content: bytes):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(content)
+    os.replace(temp_path, path)
+
+
+# Shared store used by the Money Agent
+worldbank_store = WorldBankStore()
+
+
+async def _main(args):
+    try:
+        await prefetch(args.out, args.fixtures)
+    finally:
+        await close_http_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prefetch World Bank indicators into the local store.")
+    parser.add_argument("--out", default=WORLDBANK_STORE_DIR, help="Directory to write the store to")
+    parser.add_argument("--fixtures", default=None, help="Read <INDICATOR>.json files from this directory instead of the API")
+    asyncio.run(_main(parser.parse_args()))